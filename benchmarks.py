@@ -0,0 +1,458 @@
+"""
+Benchmarks for the dashboard. They run headless with the Qt offscreen platform:
+
+```bash
+python benchmarks.py                                    # ledgers of 10k, 1M and 10M rows
+python benchmarks.py --sizes 10k 1M --output results.json
+python benchmarks.py --baseline baseline.json           # exits with 1 if a timing regressed
+```
+
+The synthetic ledgers are built once (which takes a few minutes for 10M rows), and kept in `--data-dir` for the next runs.
+All the timings are in milliseconds.
+"""
+
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import sys
+import sqlite3 as sql
+import time
+import json
+import argparse
+import platform
+import tempfile
+import itertools
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+
+from dashboard import TableModel, PagedTableModel, DashBoard
+from charts import MplCanvas
+from data_manipulation import DataHandler
+from categories import CATEGORIES
+from ledger_generator import generate_ledger, write_database
+
+SIZES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+## Part of the ledger file names, to be bumped when the generated ledgers change
+LEDGER_VERSION = 2
+
+## The ledger tables compared by `bench_storage`: the columns, and their values from the ledger (`e`) and its categories 
+## (`c`). Before the integer storage, the dates were "%Y-%m-%d" strings and the amounts REAL.
+STORAGE_LAYOUTS = {
+    "text_real": ("Date TEXT NOT NULL, Category TEXT NOT NULL, Amount REAL NOT NULL", 
+                  "date(e.Date + 2440587.5), c.Name, e.Amount / 100.0"),
+    "integer_cents": ("Date INTEGER NOT NULL, Category INTEGER NOT NULL, Amount INTEGER NOT NULL", 
+                      "e.Date, e.Category, e.Amount")
+}
+## The queries timed on each layout, and the date range they are given (if any)
+STORAGE_QUERIES = {
+    "sum_by_category": ("SELECT Category, Type, SUM(Amount) FROM {table} GROUP BY Category, Type;", None),
+    "sum_by_date[last_year]": ("SELECT Date, Type, SUM(Amount) FROM {table} WHERE Date BETWEEN ? AND ? GROUP BY Date, Type;", 
+                               365),
+    "scan[last_month]": ("SELECT Date, Category, Amount, Type FROM {table} WHERE Date BETWEEN ? AND ?;", 30)
+}
+
+
+## The TableModel.data before the columnar storage: formatting every cell with DataFrame.iloc on each repaint
+class IlocTableModel(TableModel):
+    def __init__(self, data: pd.DataFrame):
+        super().__init__(data)
+        self._frame = data
+
+    def data(self, index, role = Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
+            return str(self._frame.iloc[index.row(), index.column()])
+
+        return None
+
+def make_frame(n_rows: int, seed = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 1500, n_rows)), unit = "D")
+
+    return pd.DataFrame({
+        "id": np.arange(n_rows, dtype = np.int64),
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Category": rng.choice(CATEGORIES, n_rows),
+        "Amount": np.round(rng.lognormal(3, 1, n_rows), 2)
+    })
+
+def timed(function, repeat = 3, setup = None) -> float:
+    """
+    The median time of `function()` over `repeat` runs, calling `setup()` (untimed) before each of them.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+
+    return float(np.median(times))
+
+def bench_table_repaint(n_rows = 100_000, viewport_rows = 30, n_repaints = 500, seed = 0) -> dict:
+    """
+    Timing the `data()` calls of a repaint, i.e. every cell in a viewport, while scrolling through a table of `n_rows` rows.
+    Returns the mean repaint time in milliseconds of the previous (`iloc`) and the current (columnar) models.
+    """
+    frame = make_frame(n_rows, seed)
+    tops = np.random.default_rng(seed).integers(0, n_rows - viewport_rows, n_repaints)
+    results = {}
+
+    for name, model_class in [("iloc", IlocTableModel), ("columnar", TableModel)]:
+        model = model_class(frame)
+        start = time.perf_counter()
+
+        for top in tops:
+            for row in range(top, top + viewport_rows):
+                for col in range(model.columnCount()):
+                    model.data(model.index(row, col))
+
+        results[name] = (time.perf_counter() - start) / n_repaints * 1000
+
+    return results
+
+def bench_chart_redraw(n_redraws = 20, n_charts = 4, seed = 0) -> dict:
+    """
+    Timing the summary pie chart when the user applies the summary again: rebuilding the chart each time (as before the 
+    artist reuse), updating the values in place, showing a cached rendering, and skipping an unchanged chart.
+    Returns the mean redraw time in milliseconds of each case.
+    """
+    rng = np.random.default_rng(seed)
+    charts = [rng.lognormal(3, 1, len(CATEGORIES)) for _ in range(n_charts)]
+    canvas = MplCanvas()
+    canvas.resize(600, 400)
+    results = {}
+
+    def redraws(name, draw):
+        start = time.perf_counter()
+        for i in range(n_redraws):
+            draw(charts[i % n_charts])
+        results[name] = (time.perf_counter() - start) / n_redraws * 1000
+
+    redraws("rebuild", lambda values: (canvas._build_pie(values, CATEGORIES), canvas.draw()))
+
+    ### Fresh values every time, so that neither the cache nor the unchanged check apply.
+    redraws("update", lambda values: canvas.draw_pie(values * rng.uniform(0.5, 1.5), CATEGORIES))
+    for values in charts:
+        canvas.draw_pie(values, CATEGORIES)
+    redraws("cached", lambda values: canvas.draw_pie(values, CATEGORIES))
+    redraws("unchanged", lambda values: canvas.draw_pie(charts[0], CATEGORIES))
+
+    return results
+
+def check_id_allocation(n_rows = 5_000, seed = 0) -> list:
+    """
+    Checking that new ids can be allocated on the dates of a ledger once it's partitioned, when its ids were numbered at 
+    random within their date (as before `DataHandler.allocate_ids`), and that they are not in use.
+    Returns the descriptions of the failures.
+    """
+    rng = np.random.default_rng(seed)
+    records = generate_ledger(n_rows, seed, years = 3)
+    prefixes = pd.to_datetime(records["Date"]).dt.strftime("%Y%m%d").astype(np.int64) * 10_000
+    records.insert(0, "id", prefixes + rng.integers(0, 10_000, len(records)))
+    ## A record at the end of the id range on the dates checked, which leaves no room after the highest id in use
+    dates = records["Date"].drop_duplicates().sample(20, random_state = seed).tolist()
+    first = records.drop_duplicates("Date")
+    last = first.index[first["Date"].isin(dates)]
+    records.loc[last, "id"] = prefixes[last] + 9_999
+    records = records.drop_duplicates("id")
+    failures = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, "ledger.db")
+        db = DataHandler(db_name)
+        db.add_records(records)
+        db.close_connection()
+
+        db = DataHandler(db_name, partitioned = True)
+        try:
+            ids = db.allocate_ids([date for date in dates for _ in range(50)])
+            if set(ids) & set(records["id"]):
+                failures.append("allocate_ids handed out ids in use after partitioning")
+        except ValueError as error:
+            failures.append(f"allocate_ids failed after partitioning: {error}")
+        finally:
+            db.close_connection()
+    
+    return failures
+
+def build_ledger(db_name: str, n_rows: int, seed = 0, chunk_size = 1_000_000):
+    """
+    Building a ledger of `n_rows` synthetic records (see `ledger_generator.py`) in the database `db_name`, unless it's already there.
+    """
+    if os.path.exists(db_name):
+        db = DataHandler(db_name)
+        complete = db.count_records() == n_rows
+        db.close_connection()
+        if complete:
+            return
+        
+        ### Left over from an interrupted build
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(db_name + suffix):
+                os.remove(db_name + suffix)
+    
+    db = DataHandler(db_name)
+    write_database(db, n_rows, seed, chunk_size = chunk_size)
+    db.close_connection()
+
+def build_storage(storage_name: str, db_name: str):
+    """
+    Copying the ledger in `db_name` into one table per layout of `STORAGE_LAYOUTS`, with the same indexes as the ledger, in 
+    the database `storage_name`, unless they're already there.
+    """
+    connection = sql.connect(storage_name)
+    connection.execute("ATTACH DATABASE ? AS ledger;", (db_name, ))
+    n_rows = connection.execute("SELECT COUNT(*) FROM ledger.expenditure;").fetchone()[0]
+
+    for table, (columns, values) in STORAGE_LAYOUTS.items():
+        exists = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = ?;", (table, )).fetchone()[0]
+        if exists and connection.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0] == n_rows:
+            continue
+
+        connection.executescript(f"""
+            DROP TABLE IF EXISTS {table};
+            CREATE TABLE {table} (id INTEGER PRIMARY KEY, {columns}, Type TEXT NOT NULL);
+
+            BEGIN;
+            INSERT INTO {table}
+            SELECT e.id, {values}, e.Type
+            FROM ledger.expenditure AS e JOIN ledger.categories AS c ON c.id = e.Category
+            ORDER BY e.id;
+            CREATE INDEX idx_{table}_date ON {table} (Date, Type, Category, Amount);
+            CREATE INDEX idx_{table}_category ON {table} (Category, Type, Date, Amount);
+            COMMIT;
+        """)
+    
+    connection.execute("DETACH DATABASE ledger;")
+    connection.close()
+
+def bench_storage(storage_name: str, repeat = 3) -> dict:
+    """
+    Timing the same aggregations and range scans (see `STORAGE_QUERIES`) in SQLite on the ledger stored as before (text 
+    dates and REAL amounts) and as now (day numbers and integer cents), in the database built by `build_storage`.
+    Returns the median time in milliseconds of each query on each layout.
+    """
+    connection = sql.connect(f"file:{storage_name}?mode=ro", uri = True)
+    last = connection.execute("SELECT MAX(Date) FROM integer_cents;").fetchone()[0]
+    results = {}
+
+    for table in STORAGE_LAYOUTS:
+        for name, (query, days) in STORAGE_QUERIES.items():
+            params = ()
+            if days is not None:
+                params = (last - days, last)
+                if table == "text_real":
+                    params = tuple(str(np.datetime64(day, "D")) for day in params)
+            
+            query = query.format(table = table)
+            results[f"storage[{table},{name}]"] = timed(lambda: connection.execute(query, params).fetchall(), repeat)
+    
+    connection.close()
+
+    return results
+
+def bench_ledger(db_name: str, repeat = 3, seed = 0) -> dict:
+    """
+    Timing the queries and the writes of `DataHandler`, the repaints of the View page table and the rendering of the summary 
+    page, on the ledger in `db_name`. The queries run with an empty result cache.
+    """
+    rng = np.random.default_rng(seed)
+    db = DataHandler(db_name)
+    results = {}
+
+    ### Left over from an interrupted run, and read instead of SQLite otherwise
+    db.drop_snapshots()
+
+    days = pd.to_datetime(db.get_records(group_date = True)["Date"].unique())
+    last_year = [(days.max() - pd.Timedelta(days = 365)).date(), days.max().date()]
+    types = {"exp": (True, False), "rev": (False, True), "both": (True, True)}
+
+    ## Queries
+    for group_date, group_category, (type_name, (include_exp, include_rev)) in itertools.product([False, True], [False, True], 
+                                                                                                 types.items()):
+        name = f"get_records[group_date={group_date},group_category={group_category},{type_name}]"
+        results[name] = timed(lambda: db.get_records(last_year, CATEGORIES, group_date, group_category, 
+                                                     include_exp = include_exp, include_rev = include_rev), 
+                              repeat, setup = db.clear_cache)
+        
+    results["get_all_records"] = timed(db.get_all_records, repeat, setup = db.clear_cache)
+    results["get_summary"] = timed(lambda: db.get_summary(last_year, CATEGORIES), repeat, setup = db.clear_cache)
+    results["get_records_page"] = timed(lambda: db.get_records_page(limit = 500), repeat)
+    for granularity in ["month", "year"]:
+        results[f"get_period_summary[{granularity},group_category=True]"] = timed(
+            lambda: db.get_period_summary(None, None, granularity, CATEGORIES, group_category = True), 
+            repeat, setup = db.clear_cache)
+
+    ## Queries on the columnar snapshots of the past years (see `DataHandler.snapshot_years`), dropped before the writes
+    results["snapshot_years"] = timed(db.snapshot_years, 1)
+    results["get_all_records[snapshot]"] = timed(db.get_all_records, repeat, setup = db.clear_cache)
+    for group_date, group_category in [(False, False), (True, True), (False, True)]:
+        name = f"get_records[group_date={group_date},group_category={group_category},both,snapshot]"
+        results[name] = timed(lambda: db.get_records(last_year, CATEGORIES, group_date, group_category), 
+                              repeat, setup = db.clear_cache)
+    db.drop_snapshots()
+
+    ## Writes: inserting records, updating some of them and deleting them all again, so that the ledger is left as it was
+    insert_times, update_times, delete_times = [], [], []
+    for run in range(repeat):
+        records = generate_ledger(10_000, seed + 1000 + run)
+        records["Date"] = rng.choice(days.strftime("%Y-%m-%d"), len(records))
+
+        start = time.perf_counter()
+        records.insert(0, "id", db.allocate_ids(records["Date"].tolist()))
+        db.add_records(records)
+        insert_times.append((time.perf_counter() - start) * 1000)
+
+        changes = records.head(1000).assign(Amount = records["Amount"].head(1000) + 1).to_dict("records")
+        start = time.perf_counter()
+        db.update_records(changes)
+        update_times.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        db.delete_records(*records["id"].tolist())
+        delete_times.append((time.perf_counter() - start) * 1000)
+    
+    results["insert_10k"] = float(np.median(insert_times))
+    results["update_1k"] = float(np.median(update_times))
+    results["delete_10k"] = float(np.median(delete_times))
+
+    ## View page: the data() calls of repainting 30 rows at random positions in the first 20 pages
+    model = PagedTableModel(db, dates = [], categories = None, include_exp = True, include_rev = True)
+    while model.rowCount() < 20 * 500 and model.canFetchMore():
+        model.fetchMore()
+    
+    tops = rng.integers(0, max(1, model.rowCount() - 30), 200)
+    def repaint():
+        for top in tops:
+            for row in range(top, min(top + 30, model.rowCount())):
+                for col in range(model.columnCount()):
+                    model.data(model.index(row, col))
+    
+    results["view_repaint"] = timed(repaint, repeat) / len(tops)
+
+    ## Summary page: showing the summaries of different months, so that every one of them is drawn
+    window = DashBoard(db)
+    window._open_summary_page()
+    summaries = []
+    for month in range(repeat):
+        end = days.max() - pd.DateOffset(months = month)
+        dates = [(end - pd.DateOffset(months = 1)).date(), end.date()]
+        summaries.append((dates, *db.get_summary(dates, CATEGORIES)))
+    
+    summaries = iter(summaries)
+    def show_summary():
+        dates, summary, by_category = next(summaries)
+        window._show_summary(dates, "Expenditure", summary, by_category)
+    
+    results["summary_render"] = timed(show_summary, repeat)
+
+    ### Closing the window also closes the database.
+    window.close()
+
+    return results
+
+def compare(results: dict, baseline: dict, tolerance = 0.25, min_delta = 1.0) -> list:
+    """
+    Comparing the timings of `results` with those of `baseline` (both as written by `main`). A timing has regressed if it is 
+    more than `tolerance` (relatively) and `min_delta` milliseconds (absolutely) slower than in the baseline.
+    Returns the descriptions of the regressions.
+    """
+    regressions = []
+
+    for size, timings in results["results"].items():
+        for name, ms in timings.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is None:
+                continue
+
+            if ms > base * (1 + tolerance) and ms - base > min_delta:
+                regressions.append(f"{size} {name}: {base:.3f} ms -> {ms:.3f} ms ({ms / base - 1:+.0%})")
+
+    return regressions
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description = "Benchmarks of the dashboard on synthetic ledgers.")
+    parser.add_argument("--sizes", nargs = "+", choices = list(SIZES), default = list(SIZES), 
+                        help = "The ledger sizes to benchmark.")
+    parser.add_argument("--repeat", type = int, default = 3, help = "The runs of each timing, whose median is reported.")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--data-dir", default = os.path.join(tempfile.gettempdir(), "findashboard_benchmarks"), 
+                        help = "Where the synthetic ledgers are kept between runs.")
+    parser.add_argument("--output", help = "The JSON file to write the results to.")
+    parser.add_argument("--baseline", help = "A JSON file of earlier results to compare with.")
+    parser.add_argument("--tolerance", type = float, default = 0.25, 
+                        help = "The relative slowdown from the baseline that counts as a regression.")
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    os.makedirs(args.data_dir, exist_ok = True)
+
+    ### Correctness checks, which would make the timings meaningless if they fail
+    failures = check_id_allocation(seed = args.seed)
+    for failure in failures:
+        print(f"FAILED {failure}")
+    
+    if failures:
+        return 1
+
+    results = {
+        "meta": {
+            "date": dt.datetime.now().isoformat(timespec = "seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "results": {}
+    }
+
+    repaint = bench_table_repaint()
+    redraw = bench_chart_redraw()
+    results["results"]["micro"] = {
+        **{f"table_repaint[{name}]": ms for name, ms in repaint.items()},
+        **{f"chart_redraw[{name}]": ms for name, ms in redraw.items()}
+    }
+
+    for size in args.sizes:
+        db_name = os.path.join(args.data_dir, f"ledger_{size}_{args.seed}_v{LEDGER_VERSION}.db")
+        start = time.perf_counter()
+        build_ledger(db_name, SIZES[size], args.seed)
+        print(f"Ledger of {size} rows ready in {time.perf_counter() - start:.1f} s", file = sys.stderr)
+
+        results["results"][size] = bench_ledger(db_name, args.repeat, args.seed)
+
+        storage_name = os.path.join(args.data_dir, f"storage_{size}_{args.seed}_v{LEDGER_VERSION}.db")
+        start = time.perf_counter()
+        build_storage(storage_name, db_name)
+        print(f"Storage layouts of {size} rows ready in {time.perf_counter() - start:.1f} s", file = sys.stderr)
+        
+        results["results"][size].update(bench_storage(storage_name, args.repeat))
+
+    for size, timings in results["results"].items():
+        print(f"## {size}")
+        for name, ms in timings.items():
+            print(f"{name:<70} {ms:>12.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent = 2)
+    
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        
+        if regressions:
+            return 1
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
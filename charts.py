@@ -0,0 +1,145 @@
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+import hashlib
+import numpy as np
+from typing import List
+from collections import OrderedDict
+
+from style_sheet import BACKGROUND_COLOR
+from diagnostics import DIAGNOSTICS
+
+
+## Class for canvas and graphs, imported by the dashboard when the summary page is first opened, as matplotlib is slow to import.
+## The pie chart keeps its artists and updates them in place when only the values change, and the rendered charts are 
+## cached by a hash of their data, so that showing a chart again only copies its pixels to the screen.
+class MplCanvas(FigureCanvas):
+    def __init__(self, parent = None, width = 2, height = 2, dpi = 240, bg_color = BACKGROUND_COLOR, cache_size = 16):
+        self._fig = Figure(figsize = (width, height), dpi = dpi)
+        self._ax = self._fig.add_subplot(111)
+        self._ax.axis("off")
+        self._fig.patch.set_facecolor(bg_color)
+        super().__init__(self._fig)
+
+        ### `_pie` is the labels, wedges, percentages and legend of the chart, and `_shown` the key of the chart on screen.
+        ### `_background` is the rendering of the axes without the wedges and percentages, and the size of the canvas it 
+        ### was rendered at.
+        self._pie = None
+        self._shown = None
+        self._background = None
+        self._renders = OrderedDict()
+        self._cache_size = cache_size
+
+    def draw_pie(self, values, labels) -> str:
+        """
+        Drawing a pie chart of `values`, with a legend of `labels`.
+        Returns how the chart was drawn: `"unchanged"` if it is already on screen, `"cached"` if its rendering was cached, 
+        `"updated"` if only the values changed, and `"rebuilt"` otherwise.
+        """
+        values = np.asarray(values, dtype = float)
+        labels = [str(label) for label in labels]
+        key = self._chart_key(values, labels)
+
+        if key == self._shown:
+            return "unchanged"
+        
+        if self._pie is not None and self._pie[0] == labels and values.sum() > 0:
+            self._update_pie(values)
+            how = "updated"
+        else:
+            self._build_pie(values, labels)
+            how = "rebuilt"
+        
+        ### The artists are up to date either way, e.g. for redrawing after a resize.
+        if key in self._renders:
+            self._renders.move_to_end(key)
+            self.restore_region(self._renders[key])
+            self.blit(self._fig.bbox)
+            how = "cached"
+        else:
+            if how == "updated" and self._background is not None and self._background[1] == tuple(self._fig.bbox.bounds):
+                self._blit_pie()
+            else:
+                self.draw()
+            self._renders[key] = self.copy_from_bbox(self._fig.bbox)
+            while len(self._renders) > self._cache_size:
+                self._renders.popitem(last = False)
+        
+        self._shown = key
+        return how
+
+    def draw(self):
+        """
+        Drawing the whole figure. The wedges and percentages are animated, i.e. left out of the figure, and drawn over the 
+        rendering of the axes without them, which is kept for `_blit_pie`.
+        """
+        super().draw()
+        if self._pie is not None:
+            self._background = (self.copy_from_bbox(self._ax.bbox), tuple(self._fig.bbox.bounds))
+            self._draw_pie_artists()
+
+    def _blit_pie(self):
+        ### Only the wedges and percentages are drawn again, over the rest of the chart, which doesn't change.
+        self.restore_region(self._background[0])
+        self._draw_pie_artists()
+        self.blit(self._ax.bbox)
+
+    def _draw_pie_artists(self):
+        _, wedges, autotexts, _ = self._pie
+        for artist in [*wedges, *autotexts]:
+            self._ax.draw_artist(artist)
+
+    def _chart_key(self, values: np.ndarray, labels: List[str]) -> str:
+        ### The size of the canvas is part of the key, as the renderings depend on it.
+        digest = hashlib.blake2b(digest_size = 16)
+        digest.update(np.ascontiguousarray(values).tobytes())
+        digest.update("\0".join(labels).encode())
+        digest.update(np.asarray(self._fig.bbox.bounds).tobytes())
+
+        return digest.hexdigest()
+
+    def _build_pie(self, values: np.ndarray, labels: List[str]):
+        self._ax.clear()
+        wedges, texts, autotexts = self._ax.pie(
+            values,
+            labels = None,
+            autopct = "%1.1f%%",
+            textprops = dict(color = "black", 
+                             fontsize = 4, 
+                             fontfamily = "Arial")
+        )
+        legend = self._ax.legend(
+            wedges, labels,
+            title = "Categories",
+            loc = "center left",
+            bbox_to_anchor = (1, 0.5),
+            fontsize = 3,
+            title_fontsize = 4
+        )
+        
+        legend.get_frame().set_linewidth(0)
+        legend.get_frame().set_edgecolor("none")
+        legend.get_frame().set_color(BACKGROUND_COLOR)
+        self._fig.tight_layout()
+
+        for artist in [*wedges, *autotexts]:
+            artist.set_animated(True)
+
+        self._pie = (labels, wedges, autotexts, legend)
+        self._background = None
+
+    def _update_pie(self, values: np.ndarray):
+        ### The same geometry as `Axes.pie`: wedges counterclockwise from 0 degrees, percentages at 0.6 of the radius.
+        _, wedges, autotexts, _ = self._pie
+        fractions = values / values.sum()
+        angles = np.concatenate([[0], np.cumsum(fractions)]) * 360
+
+        for wedge, autotext, fraction, theta1, theta2 in zip(wedges, autotexts, fractions, angles[:-1], angles[1:]):
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            middle = np.deg2rad((theta1 + theta2) / 2)
+            autotext.set_position((0.6 * np.cos(middle), 0.6 * np.sin(middle)))
+            autotext.set_text(f"{100 * fraction:1.1f}%")
+
+## Timed by the diagnostics (see `diagnostics.py`)
+DIAGNOSTICS.register(MplCanvas, ["draw", "draw_pie"])
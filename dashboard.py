@@ -4,25 +4,26 @@ from PyQt5.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QGridLayout, QSpacerItem, QSizePolicy,
     QLabel, QPushButton, QCheckBox, QLineEdit, QComboBox, 
     QDateEdit, QTableView, QMessageBox, QRadioButton, QButtonGroup,
-    QFileDialog, QItemDelegate, QStyledItemDelegate
+    QFileDialog, QItemDelegate, QStyledItemDelegate, QProgressDialog
 )
 from PyQt5.QtCore import (
-    Qt, QTimer, QDate, QAbstractTableModel, QSize
+    Qt, QTimer, QDate, QAbstractTableModel, QModelIndex, QSize, QThread, pyqtSignal, 
+    QObject, QRunnable, QThreadPool
 )
 
 from PyQt5.QtGui import QIcon, QDoubleValidator
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
+import os
+import itertools
+import numpy as np
 import datetime as dt
 from dateutil.relativedelta import relativedelta
+from collections import OrderedDict
 
 from data_manipulation import *
 from style_sheet import *
 from categories import CATEGORIES
+from diagnostics import DIAGNOSTICS
 
 
 class DashBoard(QMainWindow):
@@ -48,6 +49,7 @@ class DashBoard(QMainWindow):
         self._unlock_icon = QIcon("./Icons/unlock.png")
         self._search_icon = QIcon("./Icons/search.png")
         self._download_icon = QIcon("./Icons/download.png")
+        self._upload_icon = QIcon("./Icons/upload.png")
 
         ## Date
         today = dt.date.today()
@@ -59,19 +61,18 @@ class DashBoard(QMainWindow):
         month_ago = yesterday - relativedelta(months = 1)
         self._month_ago = QDate(month_ago.year, month_ago.month, month_ago.day)
 
-        ## Connected Database
+        ## Connected Database: queries triggered by the user run in the background
         self._db = db
+        self._executor = QueryExecutor(db)
+        self._executor.busy_changed.connect(self._show_busy)
+        self._import_worker = None
+        self._export_worker = None
 
         ## Attributes for expenditure page
         self._init_ledger_page()
 
-        ## Attributes for data viewing page
-        self._init_viewing_page()        
-
-        ## Attributes for summary page
-        self._init_summary_page()
-
-        ## Interface
+        ## Interface: the data viewing and summary pages are built when they are first opened (see `_open_viewing_page` 
+        ## and `_open_summary_page`), so that the window shows up sooner
         self._pages = QStackedWidget()
         self._layout.addWidget(self._pages)
 
@@ -79,15 +80,38 @@ class DashBoard(QMainWindow):
         self._pages.addWidget(self._home_page)
 
         self._exp_page = self.create_exp_page()
-        self._viewing_page = self.create_viewing_page()
-        self._summary_page = self.create_summary_page()
+        self._viewing_page = None
+        self._summary_page = None
+        self._diagnostics_page = None
 
         self._pages.addWidget(self._exp_page)
-        self._pages.addWidget(self._viewing_page)
-        self._pages.addWidget(self._summary_page)
 
         self._pages.setCurrentWidget(self._home_page)
 
+    def _open_viewing_page(self):
+        if self._viewing_page is None:
+            self._init_viewing_page()
+            self._viewing_page = self.create_viewing_page()
+            self._pages.addWidget(self._viewing_page)
+        
+        self._pages.setCurrentWidget(self._viewing_page)
+
+    def _open_summary_page(self):
+        if self._summary_page is None:
+            self._init_summary_page()
+            self._summary_page = self.create_summary_page()
+            self._pages.addWidget(self._summary_page)
+        
+        self._pages.setCurrentWidget(self._summary_page)
+
+    def _open_diagnostics_page(self):
+        if self._diagnostics_page is None:
+            self._diagnostics_page = self.create_diagnostics_page()
+            self._pages.addWidget(self._diagnostics_page)
+        
+        self._refresh_diagnostics()
+        self._pages.setCurrentWidget(self._diagnostics_page)
+
     ##----- Home Page -----##
     def create_home_page(self):
         home = QWidget()
@@ -123,25 +147,40 @@ class DashBoard(QMainWindow):
         nevigation_layout.addWidget(button_exp)
 
         button_viewing = QPushButton("View")
-        button_viewing.clicked.connect(lambda: self._pages.setCurrentWidget(self._viewing_page))
+        button_viewing.clicked.connect(self._open_viewing_page)
         button_viewing.setFixedSize(240, 80)
         button_viewing.setStyleSheet(PAGE_BUTTON_STYLE)
         button_viewing.setToolTip("Nevigate to the page to view your expenditure history.")
         nevigation_layout.addWidget(button_viewing)
 
         button_summary = QPushButton("Summarize")
-        button_summary.clicked.connect(lambda: self._pages.setCurrentWidget(self._summary_page))
+        button_summary.clicked.connect(self._open_summary_page)
         button_summary.setFixedSize(240, 80)
         button_summary.setStyleSheet(PAGE_BUTTON_STYLE)
         button_summary.setToolTip("Nevigate to the page to summarize your past expenditure.")
         nevigation_layout.addWidget(button_summary)
 
+        if DIAGNOSTICS.enabled:
+            button_diagnostics = QPushButton("Diagnostics")
+            button_diagnostics.clicked.connect(self._open_diagnostics_page)
+            button_diagnostics.setFixedSize(240, 80)
+            button_diagnostics.setStyleSheet(PAGE_BUTTON_STYLE)
+            button_diagnostics.setToolTip("Nevigate to the page of the timings of the database queries and the rendering.")
+            nevigation_layout.addWidget(button_diagnostics)
+
         nevigation_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addLayout(nevigation_layout)
         layout.addStretch()
 
         return home
     
+    ## Busy cursor while queries are running in the background
+    def _show_busy(self, busy: bool):
+        if busy:
+            QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor)
+        else:
+            QApplication.restoreOverrideCursor()
+
     ## Update the greetings on the home page
     def _update_time_greeting(self):
         """
@@ -167,12 +206,18 @@ class DashBoard(QMainWindow):
     ##----- Tracking Expenditure Page -----##
     ## Initialization
     def _init_ledger_page(self):
-        self._temp_df = pd.DataFrame(columns = ["Date", "Category", "Amount", "Type"])
+        ### Records staged by a previous session that didn't close properly are shown again
+        self._temp_df = self._db.get_temp_rec()
         self._ledger_table = QTableView()
         self._temp_model = TableModel(self._temp_df)
         self._ledger_table.setModel(self._temp_model)
         self._ledger_table.hideColumn(0)
 
+        ## The staged records are written to the database every few seconds, so that they survive a crash
+        self._staging_timer = QTimer(self)
+        self._staging_timer.timeout.connect(lambda: self._db.flush_staging(wait = False))
+        self._staging_timer.start(5000)
+
         ## Date Input
         self._ledger_date_input = QDateEdit()
         self._ledger_date_input.setCalendarPopup(True)
@@ -180,7 +225,7 @@ class DashBoard(QMainWindow):
 
         ## Category Input
         self._ledger_category_input = QComboBox()
-        self._ledger_category_input.addItems(CATEGORIES)
+        self._ledger_category_input.addItems(self._db.get_categories())
 
         ## Amount Input
         self._ledger_amount_input = QLineEdit()
@@ -203,6 +248,11 @@ class DashBoard(QMainWindow):
                                                                      amount = self._ledger_amount_input.text(), 
                                                                      type_ = self._ledger_button_group.checkedButton().text()))
 
+        self._ledger_import_button = QPushButton()
+        self._ledger_import_button.setIcon(self._upload_icon)
+        self._ledger_import_button.clicked.connect(self._import_file)
+        self._ledger_import_button.setToolTip("Click this button to import records from a CSV, Excel or JSON file.")
+
     ## Page Layout
     def create_exp_page(self):
         exp_page = QWidget()
@@ -248,6 +298,7 @@ class DashBoard(QMainWindow):
         input_layout.addLayout(type_layout, 1, 1)
 
         ## Button
+        input_layout.addWidget(self._ledger_import_button, 2, 0, alignment = Qt.AlignmentFlag.AlignLeft)
         input_layout.addWidget(self._ledger_add_button, 2, 1, alignment = Qt.AlignmentFlag.AlignRight)
 
         ## Spacing
@@ -266,6 +317,7 @@ class DashBoard(QMainWindow):
         type_label.setStyleSheet(LABEL_STYLE)
         home_button.setFixedSize(30, 30)
         self._ledger_add_button.setFixedSize(30, 30)
+        self._ledger_import_button.setFixedSize(30, 30)
         self._ledger_table.setStyleSheet(HIDDEN_WIDGET_STYLE)
         self._ledger_date_input.calendarWidget().setFixedSize(QSize(300, 200))
 
@@ -279,8 +331,7 @@ class DashBoard(QMainWindow):
         try:
             amount = float(amount)
             self._temp_df = self._db.add_temp_rec(date, category, amount, type_[:3])
-            self._temp_model._data = self._temp_df
-            self._temp_model.layoutChanged.emit()
+            self._temp_model.set_data(self._temp_df)
         except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Warning)
@@ -291,6 +342,51 @@ class DashBoard(QMainWindow):
 
             return
     
+    ## Import records from a file, in a background thread
+    def _import_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import Records",
+            "",
+            "CSV File (*.csv);;Excel Files (*.xlsx);;JSON Files (*.json *.jsonl)"
+        )
+
+        if not file_path:
+            return
+        
+        self._import_rejected_path = os.path.splitext(file_path)[0] + "_rejected.csv"
+        self._import_worker = ImportWorker(self._db, file_path, self._import_rejected_path)
+
+        self._import_progress = QProgressDialog("Importing records...", "Cancel", 0, 0, self)
+        self._import_progress.setWindowTitle("Import")
+        self._import_progress.canceled.connect(self._import_worker.cancel)
+
+        self._import_worker.progress.connect(
+            lambda stats: self._import_progress.setLabelText(
+                f"{stats['read']} rows read, {stats['imported']} imported, {stats['rejected']} rejected."
+            )
+        )
+        self._import_worker.imported.connect(self._import_finished)
+        self._import_worker.failed.connect(self._import_failed)
+        self._import_worker.start()
+        self._import_progress.show()
+
+    def _import_finished(self, stats: dict):
+        self._import_progress.reset()
+        if self._viewing_page is not None:
+            self._table_model.refresh()
+
+        message = f"{stats['imported']} of {stats['read']} records have been imported."
+        if stats["rejected"]:
+            message += f" {stats['rejected']} invalid rows were rejected, see {self._import_rejected_path}."
+        
+        QMessageBox.information(self, "Import", message)
+
+    def _import_failed(self, error: str):
+        self._import_progress.reset()
+        if self._viewing_page is not None:
+            self._table_model.refresh()
+        QMessageBox.warning(self, "Import Error", f"The import failed: {error}")
 
     ##----- Data viewing Page -----##
     ## Initialization: buttons, table views
@@ -308,7 +404,7 @@ class DashBoard(QMainWindow):
         ## Category Input
         self._view_category_select = QListWidget()
         self._view_category_select.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
-        self._view_category_select.addItems(["All"] + CATEGORIES)
+        self._view_category_select.addItems(["All"] + self._db.get_categories())
 
         ## Type Input
         self._view_type_exp = QCheckBox("Expenditure")
@@ -326,14 +422,15 @@ class DashBoard(QMainWindow):
                                                     self._view_type_exp.isChecked(), 
                                                     self._view_type_rev.isChecked()))
         
-        ## Table View
-        self._view_df = self._db.get_all_records(include_id = True)
+        ## Table View: records are fetched from the database page by page while scrolling
         self._view_table = QTableView()
-        self._table_model = EditableTableModel(self._view_df)
+        self._table_model = PagedTableModel(self._db)
         self._view_table.setModel(self._table_model)
         self._view_table.hideColumn(0)
+        self._view_table.horizontalHeader().setSortIndicator(1, Qt.SortOrder.AscendingOrder)
+        self._view_table.setSortingEnabled(True)
         self._view_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
-        self._view_table.setItemDelegate(TableDelegate())
+        self._view_table.setItemDelegate(TableDelegate(self._db.get_categories()))
         self._view_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
 
         ## Buttons
@@ -378,16 +475,17 @@ class DashBoard(QMainWindow):
             )
 
             if confirm_box == QMessageBox.StandardButton.Yes:
-                for data in self._table_model._modified_rows.values():
-                    new_id = data["id"]
-                    new_date = data["Date"]
-                    new_category = data["Category"]
-                    new_amount = data["Amount"]
-
-                    self._db.update_record(new_id, new_date, new_category, new_amount)
+                modified_rows = list(self._table_model._modified_rows.values())
                 
-                self._table_model._modified_rows.clear()
-                QMessageBox.information(self, "Success", "Changes have been applied!")
+                self._executor.submit(None, lambda db: db.update_records(modified_rows), 
+                                      self._changes_applied, self._query_failed)
+
+    def _changes_applied(self, _):
+        self._table_model.refresh()
+        QMessageBox.information(self, "Success", "Changes have been applied!")
+
+    def _query_failed(self, error: str):
+        QMessageBox.warning(self, "Database Error", f"The operation failed: {error}")
     
     ## Delete records
     def _delete_records(self):
@@ -402,18 +500,27 @@ class DashBoard(QMainWindow):
         
         confirm_box = QMessageBox.question(
             self, "Confirm Deletion",
-            f"Are you sure to delete the selected record? Note that this cannot be undone!", 
+            f"Are you sure to delete the {len(selected_index)} selected record(s)? Note that this cannot be undone!", 
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
 
         if confirm_box == QMessageBox.StandardButton.Yes:
-            QMessageBox.information(self, "Success", "The record have been deleted.")
-            selected_row = selected_index[0].row()
-            record_id = int(self._table_model._data.iloc[selected_row]["id"])
-
-            self._db.delete_records(record_id)
-            self._table_model._data = self._table_model._data[self._table_model._data["id"] != record_id]
-            self._table_model.layoutChanged.emit()
+            rows = sorted(index.row() for index in selected_index)
+            record_ids = [self._table_model.record_id(row) for row in rows]
+            version = self._table_model.version()
+
+            self._executor.submit(None, lambda db: db.delete_records(*record_ids), 
+                                  lambda deleted: self._records_deleted(deleted, rows, record_ids, version), 
+                                  self._query_failed)
+
+    def _records_deleted(self, deleted: int, rows: List[int], record_ids: List[int], version: int):
+        ### Only the deleted rows are removed from the table, unless it has been reset meanwhile.
+        if self._table_model.version() == version:
+            self._table_model.remove_rows(rows, record_ids)
+        else:
+            self._table_model.refresh()
+        
+        QMessageBox.information(self, "Success", f"{deleted} record(s) have been deleted.")
     
     ## Save File
     def _save_files(self):
@@ -426,15 +533,36 @@ class DashBoard(QMainWindow):
             options = options
         )
 
-        if file_path:
-            if file_path.endswith(".csv"):
-                self._view_df.to_csv(file_path, index = False)
-            elif file_path.endswith(".xlsx"):
-                self._view_df.to_excel(file_path, index = False)
-            elif file_path.endswith(".json"):
-                self._view_df.to_json(file_path, orient = "records")
-            
-            QMessageBox.information(self, "Success", f"File has been successfully saved to {file_path}")
+        if not file_path:
+            return
+        
+        ### The records of the current filters are streamed from the database in a background thread.
+        self._export_path = file_path
+        self._export_worker = ExportWorker(self._db, file_path, self._table_model.filters())
+
+        self._export_progress = QProgressDialog("Saving records...", "Cancel", 0, 100, self)
+        self._export_progress.setWindowTitle("Save")
+        self._export_progress.canceled.connect(self._export_worker.cancel)
+
+        self._export_worker.progress.connect(self._export_progressed)
+        self._export_worker.exported.connect(self._export_finished)
+        self._export_worker.failed.connect(self._export_failed)
+        self._export_worker.start()
+        self._export_progress.show()
+
+    def _export_progressed(self, exported: int, total: int):
+        self._export_progress.setLabelText(f"{exported} of {total} records saved.")
+        self._export_progress.setValue(int(100 * exported / total) if total else 100)
+
+    def _export_finished(self, stats: dict):
+        self._export_progress.reset()
+
+        if not stats["cancelled"]:
+            QMessageBox.information(self, "Success", f"File has been successfully saved to {self._export_path}")
+
+    def _export_failed(self, error: str):
+        self._export_progress.reset()
+        QMessageBox.warning(self, "Save Error", f"The file could not be saved: {error}")
 
     ## Initializing the viewing page
     def create_viewing_page(self):
@@ -515,28 +643,27 @@ class DashBoard(QMainWindow):
     ## Update table based on user input
     def _update_data_viewing(self, start_date: dt.date, end_date: dt.date, categories: List[str], 
                              include_exp: bool, include_rev: bool):
-        if categories:
-            if "All" in categories:
-                cats = CATEGORIES
-            else:
-                cats = categories
+        ### `None` selects all categories.
+        if categories and "All" not in categories:
+            cats = categories
         else:
-            cats = CATEGORIES
+            cats = None
         
-        self._view_df = self._db.get_records(dates = [start_date, end_date], categories = cats, 
-                                             group_date = False, group_category = False, 
-                                             include_id = True, 
-                                             include_exp = include_exp, include_rev = include_rev)
-        
-        self._table_model._data = self._view_df
-        self._table_model.layoutChanged.emit()
+        filters = dict(dates = [start_date, end_date], categories = cats, 
+                       include_exp = include_exp, include_rev = include_rev)
+        request = self._table_model.first_page_request(**filters)
+
+        ### Only the first page is queried in the background; a newer query supersedes this one.
+        self._executor.submit("view", lambda db: db.get_records_page(**request), 
+                              lambda page: self._table_model.set_filters(first_page = page, **filters), 
+                              self._query_failed)
 
     ##----- Summary Page -----##
     def _init_summary_page(self):
         ## Category Selection
         self._summary_category_select = QListWidget()
         self._summary_category_select.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
-        self._summary_category_select.addItems(["All"] + CATEGORIES)
+        self._summary_category_select.addItems(["All"] + self._db.get_categories())
         
         ## Date Input
         self._summary_start_date = QDateEdit()
@@ -559,6 +686,11 @@ class DashBoard(QMainWindow):
         self._summary_category_checkbox = QCheckBox("Category")
         self._summary_date_checkbox = QCheckBox("Date")
 
+        ## Granularity of the Date summary: longer periods keep multi-year summaries short
+        self._summary_granularity = QComboBox()
+        self._summary_granularity.addItems(["Day", "Week", "Month", "Quarter", "Year"])
+        self._summary_granularity.setToolTip("Summarize the dates by day, week, month, quarter or year.")
+
         ## Apply Button
         self._summary_apply_button = QPushButton()
         self._summary_apply_button.setIcon(self._check_icon)
@@ -570,17 +702,21 @@ class DashBoard(QMainWindow):
                                                        categories = [item.text() for item in self._summary_category_select.selectedItems()],
                                                        group_date = self._summary_date_checkbox.isChecked(),
                                                        group_category = self._summary_category_checkbox.isChecked(), 
-                                                       included_type = self._summary_button_group.checkedButton().text()))
+                                                       included_type = self._summary_button_group.checkedButton().text(), 
+                                                       granularity = self._summary_granularity.currentText().lower()))
 
-        ## Table & Text & Canvas
+        ## Table & Text & Canvas: matplotlib is only imported now, as it takes a while
+        from charts import MplCanvas
         self._canvas = MplCanvas(self)
         self._summary_df = pd.DataFrame()
         self._summary_table = QTableView()
+        self._summary_model = TableModel(self._summary_df)
+        self._summary_table.setModel(self._summary_model)
         self._summary_text = QLabel()
 
     def _display_summary(self, dates: List[dt.date], categories: List[str], 
                          group_date: bool, group_category: bool, 
-                         included_type: str):
+                         included_type: str, granularity = "day"):
         
         if not group_date and not group_category:
             msg = QMessageBox()
@@ -593,7 +729,7 @@ class DashBoard(QMainWindow):
             return
         
         if "All" in categories:
-            categories = CATEGORIES
+            categories = None
         
         if included_type == "Expenditure":
             include_exp = True
@@ -602,12 +738,21 @@ class DashBoard(QMainWindow):
             include_exp = False
             include_rev = True
 
-        self._summary_df = self._db.get_records(dates, categories, 
-                                                group_date = group_date, 
-                                                group_category = group_category, 
-                                                include_exp = include_exp,
-                                                include_rev = include_rev)
+        self._executor.submit("summary", 
+                              lambda db: db.get_summary(dates, categories, 
+                                                        group_date = group_date, 
+                                                        group_category = group_category, 
+                                                        include_exp = include_exp,
+                                                        include_rev = include_rev, 
+                                                        granularity = granularity), 
+                              lambda result: self._show_summary(dates, included_type, *result), 
+                              self._query_failed)
+
+    def _show_summary(self, dates: List[dt.date], included_type: str, 
+                      summary_df: pd.DataFrame, summary_table: pd.DataFrame):
         
+        self._summary_df = summary_df
+
         if included_type == "Expenditure":
             total_exp = self._summary_df["Amount"].sum()
             summary_text = f"From {dates[0]} to {dates[1]}, total expenditure is ${total_exp:.2f}."
@@ -617,42 +762,9 @@ class DashBoard(QMainWindow):
             summary_text = f"From {dates[0]} to {dates[1]}, total revenue is ${total_rev:.2f}."
 
         self._summary_text.setText(summary_text)
-        self._summary_table.setModel(TableModel(self._summary_df))
+        self._summary_model.set_data(self._summary_df)
 
-        if group_date and group_category:
-            summary_table = self._summary_df.groupby("Category")["Amount"].sum().reset_index()
-        elif (not group_date) and group_category:
-            summary_table = self._summary_df
-        else:
-            summary_table = self._db.get_records(dates, categories, 
-                                                 group_date = False, 
-                                                 group_category = True, 
-                                                 include_exp = include_exp,
-                                                 include_rev = include_rev)
-
-        self._canvas._ax.clear()
-        wedges, texts, autotexts = self._canvas._ax.pie(
-            summary_table["Amount"],
-            labels = None,
-            autopct = "%1.1f%%",
-            textprops = dict(color = "black", 
-                             fontsize = 4, 
-                             fontfamily = "Arial")
-        )
-        legend = self._canvas._ax.legend(
-            wedges, summary_table["Category"],
-            title = "Categories",
-            loc = "center left",
-            bbox_to_anchor = (1, 0.5),
-            fontsize = 3,
-            title_fontsize = 4
-        )
-        
-        legend.get_frame().set_linewidth(0)
-        legend.get_frame().set_edgecolor("none")
-        legend.get_frame().set_color(BACKGROUND_COLOR)
-        self._canvas._fig.tight_layout()
-        self._canvas.draw()
+        self._canvas.draw_pie(summary_table["Amount"], summary_table["Category"])
 
     def create_summary_page(self):
         """Tab for summary and visualization."""
@@ -708,6 +820,7 @@ class DashBoard(QMainWindow):
         criteria_layout.addWidget(summary_label)
         criteria_layout.addWidget(self._summary_category_checkbox)
         criteria_layout.addWidget(self._summary_date_checkbox)
+        criteria_layout.addWidget(self._summary_granularity)
         criteria_layout.addStretch()
         layout.addLayout(criteria_layout)
         layout.addWidget(self._summary_apply_button)
@@ -736,35 +849,278 @@ class DashBoard(QMainWindow):
 
         return summary_page
     
+    ##----- Diagnostics Page -----##
+    def create_diagnostics_page(self):
+        """Tab for the timings recorded by the diagnostics (see `diagnostics.py`)."""
+        diagnostics_page = QWidget()
+        layout = QVBoxLayout(diagnostics_page)
+
+        ## Home Button and the buttons for refreshing, resetting and saving the timings
+        buttons_layout = QHBoxLayout()
+        home_button = QPushButton()
+        home_button.setIcon(self._home_icon)
+        home_button.clicked.connect(lambda: self._pages.setCurrentWidget(self._home_page))
+
+        refresh_button = QPushButton()
+        refresh_button.setIcon(self._search_icon)
+        refresh_button.setToolTip("Refresh the timings.")
+        refresh_button.clicked.connect(self._refresh_diagnostics)
+
+        reset_button = QPushButton()
+        reset_button.setIcon(self._delete_icon)
+        reset_button.setToolTip("Reset the timings.")
+        reset_button.clicked.connect(lambda: (DIAGNOSTICS.reset(), self._refresh_diagnostics()))
+
+        save_button = QPushButton()
+        save_button.setIcon(self._download_icon)
+        save_button.setToolTip("Save the timings as JSON.")
+        save_button.clicked.connect(self._save_diagnostics)
+
+        for button in (home_button, refresh_button, reset_button, save_button):
+            button.setFixedSize(30, 30)
+            buttons_layout.addWidget(button)
+        
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+        ## Tables of the timed methods and of the SQL statements
+        self._diagnostics_label = QLabel()
+        self._diagnostics_label.setStyleSheet(LABEL_STYLE)
+        layout.addWidget(self._diagnostics_label)
+
+        self._timings_model = TableModel(pd.DataFrame())
+        timings_table = QTableView()
+        timings_table.setModel(self._timings_model)
+        layout.addWidget(timings_table)
+
+        statements_label = QLabel("SQL statements")
+        statements_label.setStyleSheet(LABEL_STYLE)
+        layout.addWidget(statements_label)
+
+        self._statements_model = TableModel(pd.DataFrame())
+        statements_table = QTableView()
+        statements_table.setModel(self._statements_model)
+        layout.addWidget(statements_table)
+
+        return diagnostics_page
+    
+    def _refresh_diagnostics(self):
+        snapshot = DIAGNOSTICS.snapshot()
+        columns = ["count", "total_ms", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"]
+
+        timings = pd.DataFrame([{"Name": name, **{column: timing[column] for column in columns}} 
+                                for name, timing in snapshot["timings"].items()], 
+                               columns = ["Name"] + columns)
+        statements = pd.DataFrame([{column: statement[column] for column in ["statement", "executions", "rows"] + columns} 
+                                   for statement in snapshot["statements"]], 
+                                  columns = ["statement", "executions", "rows"] + columns)
+        
+        self._diagnostics_label.setText(f"Timings since {snapshot['since']} ({snapshot['seconds']:.0f} s)")
+        self._timings_model.set_data(timings.round(3))
+        self._statements_model.set_data(statements.round(3))
+
+    def _save_diagnostics(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Timings As", "", "JSON Files (*.json)")
+
+        if file_path:
+            DIAGNOSTICS.dump(file_path)
+
     def closeEvent(self, event):
+        ### The background work shares the database connections, so it must finish before they are closed.
+        for worker in (self._import_worker, self._export_worker):
+            if worker is not None:
+                worker.cancel()
+                worker.wait()
+        
+        self._executor.shutdown()
         self._db.close_connection()
         print("Database connection closed")
         event.accept()
 
+## Column storage for the table models: one NumPy array per column, and display strings formatted lazily 
+## per column, a block of rows at a time
+class ColumnStore:
+    BLOCK_SIZE = 1024
+
+    def __init__(self, data: pd.DataFrame):
+        self.columns = list(data.columns)
+        self.index = data.index
+        self._arrays = [data.iloc[:, col].to_numpy(copy = True) for col in range(data.shape[1])]
+        self._strings = [{} for _ in range(data.shape[1])]
+
+    def __len__(self):
+        return len(self.index)
+
+    def value(self, row: int, col: int):
+        ### NumPy scalars are converted to Python scalars, e.g. for binding them in SQL queries.
+        value = self._arrays[col][row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def display(self, row: int, col: int) -> str:
+        block, offset = divmod(row, self.BLOCK_SIZE)
+        strings = self._strings[col].get(block)
+
+        if strings is None:
+            start = block * self.BLOCK_SIZE
+            values = self._arrays[col][start:start + self.BLOCK_SIZE].tolist()
+            strings = self._strings[col][block] = [str(value) for value in values]
+
+        return strings[offset]
+
+    def set_value(self, row: int, col: int, value):
+        array = self._arrays[col]
+        if not np.can_cast(np.asarray(value).dtype, array.dtype, casting = "safe"):
+            array = self._arrays[col] = array.astype(object)
+
+        array[row] = value
+
+        ### Only the string of the edited cell is refreshed.
+        block, offset = divmod(row, self.BLOCK_SIZE)
+        if block in self._strings[col]:
+            self._strings[col][block][offset] = str(self.value(row, col))
+
+    def row(self, row: int) -> dict:
+        return {column: self.value(row, col) for col, column in enumerate(self.columns)}
+
+    def drop(self, rows):
+        self._arrays = [np.delete(array, rows) for array in self._arrays]
+        self.index = self.index.delete(rows)
+        self._keep_strings(np.min(rows) if len(rows) else len(self))
+
+    def insert(self, position: int, other: "ColumnStore", rows):
+        """
+        Inserting the `rows` of `other` (with the same columns) before `position`.
+        """
+        self._arrays = [np.concatenate([array[:position], other_array[rows], array[position:]]) 
+                        for array, other_array in zip(self._arrays, other._arrays)]
+        self.index = self.index[:position].append(other.index[rows]).append(self.index[position:])
+        self._keep_strings(position)
+
+    def assign(self, other: "ColumnStore", changed_rows):
+        """
+        Taking the values of `other`, which has the same rows except the `changed_rows`: only the strings of the blocks 
+        with changed rows are formatted again.
+        """
+        self.columns = other.columns
+        self.index = other.index
+        self._arrays = other._arrays
+        
+        changed_blocks = set((np.asarray(changed_rows) // self.BLOCK_SIZE).tolist())
+        self._strings = [{block: strings for block, strings in blocks.items() if block not in changed_blocks} 
+                         for blocks in self._strings]
+
+    def _keep_strings(self, first_row: int):
+        ### The rows from `first_row` on have moved, so only the strings of the blocks before it are still valid.
+        self._strings = [{block: strings for block, strings in blocks.items() if (block + 1) * self.BLOCK_SIZE <= first_row} 
+                         for blocks in self._strings]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._arrays[self.columns.index(name)]
+
+def row_ranges(rows) -> List[tuple]:
+    """
+    Splitting sorted row numbers into contiguous (first, last) ranges.
+    """
+    rows = np.asarray(rows, dtype = np.int64)
+    if not len(rows):
+        return []
+    
+    return [(int(chunk[0]), int(chunk[-1])) for chunk in np.split(rows, np.flatnonzero(np.diff(rows) != 1) + 1)]
+
+def diff_rows(old: ColumnStore, new: ColumnStore, key = "id", max_ranges = 64):
+    """
+    Comparing two versions of a table, whose rows are matched by the `key` column (or by position if there is no such column).
+    Returns the ranges of removed rows (in `old`), of inserted rows (in `new`) and the changed rows (in `new`); or `None` if 
+    the columns differ, if the rows in both versions are not in the same order, or if there are more than `max_ranges` 
+    ranges, in which case resetting the model is cheaper.
+    """
+    if old.columns != new.columns:
+        return None
+    
+    if key in old.columns:
+        old_keys, new_keys = old.column(key), new.column(key)
+    else:
+        old_keys, new_keys = np.arange(len(old)), np.arange(len(new))
+    
+    kept_old = np.isin(old_keys, new_keys)
+    kept_new = np.isin(new_keys, old_keys)
+    if not np.array_equal(old_keys[kept_old], new_keys[kept_new]):
+        return None
+    
+    removed = row_ranges(np.flatnonzero(~kept_old))
+    inserted = row_ranges(np.flatnonzero(~kept_new))
+    if len(removed) + len(inserted) > max_ranges:
+        return None
+    
+    changed = np.zeros(int(kept_new.sum()), dtype = bool)
+    for name in old.columns:
+        changed |= np.asarray(old.column(name)[kept_old] != new.column(name)[kept_new], dtype = bool)
+
+    return removed, inserted, np.flatnonzero(kept_new)[changed]
+
+def apply_delta(model: QAbstractTableModel, store: ColumnStore, new: ColumnStore, delta: tuple, resized = None):
+    """
+    Turning `store` into `new` in place, given their difference from `diff_rows`, and signalling each range of removed, 
+    inserted and changed rows to the views of `model`. `resized` is called whenever the number of rows of `store` changes.
+    """
+    removed, inserted, changed = delta
+    
+    ### Removing from the bottom up, then inserting from the top down, so that the row numbers of each range are still valid.
+    for first, last in reversed(removed):
+        model.beginRemoveRows(QModelIndex(), first, last)
+        store.drop(np.arange(first, last + 1))
+        if resized is not None:
+            resized()
+        model.endRemoveRows()
+    
+    for first, last in inserted:
+        model.beginInsertRows(QModelIndex(), first, last)
+        store.insert(first, new, np.arange(first, last + 1))
+        if resized is not None:
+            resized()
+        model.endInsertRows()
+
+    store.assign(new, changed)
+    for first, last in row_ranges(changed):
+        model.dataChanged.emit(model.index(first, 0), model.index(last, model.columnCount() - 1), 
+                               [Qt.ItemDataRole.DisplayRole])
+
 ## Class for displaying pandas data frames (pd.DataFrame)
 class TableModel(QAbstractTableModel):
     def __init__(self, data: pd.DataFrame):
         super().__init__()
-        self._data = data
+        self._store = ColumnStore(data)
     
+    def set_data(self, data: pd.DataFrame):
+        ### Only the rows that differ are signalled, so the views keep their state and repaint just these rows.
+        new = ColumnStore(data)
+        delta = diff_rows(self._store, new)
+
+        if delta is None:
+            self.beginResetModel()
+            self._store = new
+            self.endResetModel()
+        else:
+            apply_delta(self, self._store, new, delta)
+
     def rowCount(self, parent = None):
-        return self._data.shape[0]
+        return len(self._store)
 
     def columnCount(self, parent = None):
-        return self._data.shape[1]
+        return len(self._store.columns)
 
     def data(self, index, role = Qt.ItemDataRole.DisplayRole):
         if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
-            return str(self._data.iloc[index.row(), index.column()])
+            return self._store.display(index.row(), index.column())
 
         return None
 
     def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
         if role == Qt.ItemDataRole.DisplayRole:
             if orientation == Qt.Orientation.Horizontal:
-                return str(self._data.columns[section])
+                return str(self._store.columns[section])
             elif orientation == Qt.Orientation.Vertical:
-                return str(self._data.index[section])
+                return str(self._store.index[section])
         
         return None
 
@@ -772,33 +1128,60 @@ class TableModel(QAbstractTableModel):
 class EditableTableModel(QAbstractTableModel):
     def __init__(self, data: pd.DataFrame, categories = CATEGORIES, id_col = 0):
         super().__init__()
-        self._data = data
+        self._store = ColumnStore(data)
         self._categories = categories
         self._id_col = id_col
         self._modified_rows = {}
     
+    def set_data(self, data: pd.DataFrame):
+        new = ColumnStore(data)
+        delta = diff_rows(self._store, new)
+        self._modified_rows.clear()
+
+        if delta is None:
+            self.beginResetModel()
+            self._store = new
+            self.endResetModel()
+        else:
+            apply_delta(self, self._store, new, delta)
+
     def rowCount(self, parent = None):
-        return self._data.shape[0]
+        return len(self._store)
 
     def columnCount(self, parent = None):
-        return self._data.shape[1]
+        return len(self._store.columns)
 
     def data(self, index, role = Qt.ItemDataRole.DisplayRole):
         if index.isValid() and role == Qt.ItemDataRole.DisplayRole:
-            return str(self._data.iloc[index.row(), index.column()])
+            return self._display(index.row(), index.column())
 
         return None
 
     def setData(self, index, value, role = Qt.ItemDataRole.EditRole):
         if index.isValid() and role == Qt.ItemDataRole.EditRole:
             if index.column() != self._id_col:
-                self._data.iloc[index.row(), index.column()] = value
-                self._modified_rows[index.row()] = self._data.iloc[index.row()].to_dict()
+                self._set_cell(index.row(), index.column(), value)
+                self._modified_rows[index.row()] = self.row_data(index.row())
                 self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
             return True
 
         return False
 
+    def _display(self, row: int, col: int) -> str:
+        return self._store.display(row, col)
+
+    def _cell(self, row: int, col: int):
+        return self._store.value(row, col)
+
+    def _set_cell(self, row: int, col: int, value):
+        self._store.set_value(row, col, value)
+
+    def row_data(self, row: int) -> dict:
+        return self._store.row(row)
+
+    def record_id(self, row: int) -> int:
+        return int(self._cell(row, self._id_col))
+
     def flags(self, index):
         if index.isValid():
             if index.column() == self._id_col:
@@ -811,12 +1194,255 @@ class EditableTableModel(QAbstractTableModel):
     def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
         if role == Qt.ItemDataRole.DisplayRole:
             if orientation == Qt.Orientation.Horizontal:
-                return self._data.columns[section]
+                return self._store.columns[section]
             elif orientation == Qt.Orientation.Vertical:
                 return str(section)
         
         return None
 
+## Editable table model over the records in the database: records are fetched page by page (keyset pagination) 
+## while the view scrolls, and only the most recently used pages are kept in memory. Pages shrink when their records 
+## are deleted, so the rows of page k start at `_page_ends[k - 1]`.
+class PagedTableModel(EditableTableModel):
+    def __init__(self, db: DataHandler, page_size = 500, max_pages = 20, 
+                 categories = CATEGORIES, id_col = 0, **filters):
+        
+        super().__init__(pd.DataFrame(columns = ["id", "Date", "Category", "Amount"]), categories, id_col)
+        self._db = db
+        self._page_size = page_size
+        self._max_pages = max_pages
+        self._filters = filters
+        self._sort_by = "Date"
+        self._ascending = True
+        self._version = 0
+        self._reset_pages()
+
+    def _reset_pages(self, first_page: pd.DataFrame = None):
+        ### `_bookmarks[k]` is the (sort value, id) of the last record before page k.
+        self._pages = OrderedDict()
+        self._bookmarks = [None]
+        self._page_lengths = []
+        self._page_ends = np.zeros(0, dtype = np.int64)
+        self._exhausted = False
+        self._modified_rows.clear()
+        self._version += 1
+
+        if first_page is not None:
+            self._pages[0] = ColumnStore(first_page)
+        self._row_count = len(self._next_page())
+
+    def version(self) -> int:
+        """
+        Counting the resets of the model, e.g. to tell whether rows captured earlier still refer to the same records.
+        """
+        return self._version
+
+    def _next_page(self) -> ColumnStore:
+        """
+        Fetching the page after the last fetched one.
+        """
+        page_number = len(self._bookmarks) - 1
+        page = self._page(page_number)
+
+        if len(page) < self._page_size:
+            self._exhausted = True
+        if len(page):
+            self._bookmarks.append((page.column(self._sort_by)[-1], page.column("id")[-1]))
+            self._page_lengths.append(len(page))
+            self._page_ends = np.cumsum(self._page_lengths)
+
+        return page
+
+    def _page(self, page_number: int) -> ColumnStore:
+        if page_number in self._pages:
+            self._pages.move_to_end(page_number)
+            return self._pages[page_number]
+        
+        ### A page fetched again only has the records left since it was first fetched.
+        if page_number < len(self._page_lengths):
+            limit = self._page_lengths[page_number]
+        else:
+            limit = self._page_size
+        
+        page = self._db.get_records_page(**self._filters, 
+                                         sort_by = self._sort_by, ascending = self._ascending, 
+                                         after = self._bookmarks[page_number], limit = limit)
+        page = self._pages[page_number] = ColumnStore(page)
+
+        while len(self._pages) > self._max_pages:
+            self._pages.popitem(last = False)
+
+        return page
+
+    def filters(self) -> dict:
+        return dict(self._filters)
+
+    def first_page_request(self, **filters) -> dict:
+        """
+        The arguments of `DataHandler.get_records_page` for the first page under `filters`, e.g. for querying it in the 
+        background before calling `set_filters`.
+        """
+        return dict(filters, sort_by = self._sort_by, ascending = self._ascending, limit = self._page_size)
+
+    def set_filters(self, first_page: pd.DataFrame = None, **filters):
+        """
+        Showing the records under `filters`, from their first page (which is queried if not given). The later pages and the 
+        pending changes are discarded, and the rows of the first page are updated in place where possible (see `diff_rows`).
+        """
+        self._filters = filters
+        if first_page is None:
+            first_page = self._db.get_records_page(**self.first_page_request(**filters))
+
+        new = ColumnStore(first_page)
+        page = self._pages.get(0)
+        delta = diff_rows(page, new) if page is not None else None
+
+        if delta is None:
+            self.beginResetModel()
+            self._reset_pages(first_page)
+            self.endResetModel()
+            return
+        
+        edited_ids = [self.record_id(row) for row in self._modified_rows]
+        self._version += 1
+
+        if self._row_count > len(page):
+            self.beginRemoveRows(QModelIndex(), len(page), self._row_count - 1)
+            self._keep_first_page(page)
+            self.endRemoveRows()
+        else:
+            self._keep_first_page(page)
+
+        self._modified_rows.clear()
+        apply_delta(self, page, new, delta, resized = lambda: self._keep_first_page(page))
+
+        self._exhausted = len(page) < self._page_size
+        if len(page):
+            self._bookmarks.append((page.column(self._sort_by)[-1], page.column("id")[-1]))
+        
+        ### The rows whose pending changes are discarded show their values in the database again.
+        for first, last in row_ranges(np.flatnonzero(np.isin(page.column("id"), edited_ids))):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, self.columnCount() - 1), 
+                                  [Qt.ItemDataRole.DisplayRole])
+
+    def _keep_first_page(self, page: ColumnStore):
+        ### No more pages are fetched until the first one is up to date.
+        self._pages = OrderedDict([(0, page)])
+        self._bookmarks = [None]
+        self._page_lengths = [len(page)]
+        self._page_ends = np.cumsum(self._page_lengths)
+        self._row_count = len(page)
+        self._exhausted = True
+
+    def refresh(self):
+        """
+        Querying the records again, e.g. after the database has been modified (see `set_filters`).
+        """
+        self.set_filters(**self._filters)
+
+    def sort(self, column, order = Qt.SortOrder.AscendingOrder):
+        self.beginResetModel()
+        self._sort_by = self._store.columns[column]
+        self._ascending = (order == Qt.SortOrder.AscendingOrder)
+        self._reset_pages()
+        self.endResetModel()
+
+    def remove_rows(self, rows: List[int], record_ids: List[int]):
+        """
+        Removing deleted records from the table, given their rows and ids. Each contiguous range of rows is removed with 
+        `beginRemoveRows`/`endRemoveRows`, from the bottom up, so that the view only updates the rows that moved.
+        """
+        expected = dict(zip(rows, record_ids))
+        rows = sorted(expected, reverse = True)
+        
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+
+            removed = {}
+            for row in range(first, last + 1):
+                page_number, offset = self._locate(row)
+                removed.setdefault(page_number, []).append((offset, expected[row]))
+
+            self.beginRemoveRows(QModelIndex(), first, last)
+
+            for page_number, records in removed.items():
+                page = self._pages.get(page_number)
+
+                if page is not None:
+                    ### A page fetched again between the deletion and now already misses the deleted records.
+                    if all(page.value(offset, self._id_col) == record_id for offset, record_id in records):
+                        page.drop([offset for offset, _ in records])
+                    else:
+                        del self._pages[page_number]
+                
+                self._page_lengths[page_number] -= len(records)
+                self._page_ends[page_number:] -= len(records)
+            
+            count = last - first + 1
+            self._row_count -= count
+            self._modified_rows = {(row - count if row > last else row): record 
+                                   for row, record in self._modified_rows.items() 
+                                   if not first <= row <= last}
+            self.endRemoveRows()
+
+    def _locate(self, row: int) -> tuple:
+        page_number = int(np.searchsorted(self._page_ends, row, side = "right"))
+        start = int(self._page_ends[page_number - 1]) if page_number else 0
+
+        return page_number, row - start
+
+    def rowCount(self, parent = None):
+        return self._row_count
+
+    def canFetchMore(self, parent = QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent = QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        
+        page = self._next_page()
+        if len(page):
+            self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(page) - 1)
+            self._row_count += len(page)
+            self.endInsertRows()
+
+    def _display(self, row: int, col: int) -> str:
+        if row in self._modified_rows:
+            return str(self._modified_rows[row][self._store.columns[col]])
+        
+        page_number, offset = self._locate(row)
+        page = self._page(page_number)
+        if offset >= len(page):
+            return ""
+        
+        return page.display(offset, col)
+
+    def _cell(self, row: int, col: int):
+        if row in self._modified_rows:
+            return self._modified_rows[row][self._store.columns[col]]
+        
+        page_number, offset = self._locate(row)
+        page = self._page(page_number)
+        if offset >= len(page):
+            return ""
+        
+        return page.value(offset, col)
+
+    def _set_cell(self, row: int, col: int, value):
+        ### Pages might be evicted, so the modified rows are kept aside until the changes are applied.
+        record = self.row_data(row)
+        record[self._store.columns[col]] = value
+        self._modified_rows[row] = record
+
+    def row_data(self, row: int) -> dict:
+        if row in self._modified_rows:
+            return dict(self._modified_rows[row])
+        
+        return {column: self._cell(row, col) for col, column in enumerate(self._store.columns)}
+
 class TableDelegate(QStyledItemDelegate):
     def __init__(self, categories = CATEGORIES, 
                  id_col = 0, date_col = 1, 
@@ -866,11 +1492,155 @@ class TableDelegate(QStyledItemDelegate):
             except ValueError:
                 pass
 
-## Class for canvas and graphs
-class MplCanvas(FigureCanvas):
-    def __init__(self, parent = None, width = 2, height = 2, dpi = 240, bg_color = BACKGROUND_COLOR):
-        self._fig = Figure(figsize = (width, height), dpi = dpi)
-        self._ax = self._fig.add_subplot(111)
-        self._ax.axis("off")
-        self._fig.patch.set_facecolor(bg_color)
-        super().__init__(self._fig)
\ No newline at end of file
+## Running database queries in a thread pool, and delivering the results to the GUI thread through signals.
+## The pool threads share the DataHandler of the dashboard, which gives each of them a read connection of its own.
+class QueryExecutor(QObject):
+    busy_changed = pyqtSignal(bool)
+    _done = pyqtSignal(object, int, object, object)
+
+    def __init__(self, db: DataHandler, max_threads = 2):
+        super().__init__()
+        self._db = db
+
+        ### Reads run in parallel with each other and with a write; writes are serialized by the DataHandler. With a 
+        ### single thread, the queries would run in the order they are submitted.
+        self._pool = QThreadPool()
+        self._pool.setMaxThreadCount(max_threads)
+        self._pool.setExpiryTimeout(-1)
+
+        self._requests = itertools.count()
+        self._latest = {}
+        self._callbacks = {}
+        self._done.connect(self._deliver)
+
+    def submit(self, channel, query, on_result, on_error = None):
+        """
+        Running `query(db)` in the background, and then calling `on_result` with its result (or `on_error` with the error 
+        message) in the GUI thread.
+        A request supersedes the earlier ones of the same `channel`: these are skipped if they haven't started yet, and 
+        their results are dropped otherwise. Requests of the channel `None` (e.g. writes) are never superseded.
+        """
+        request = next(self._requests)
+        if channel is not None:
+            self._latest[channel] = request
+
+        if not self._callbacks:
+            self.busy_changed.emit(True)
+        self._callbacks[request] = (on_result, on_error)
+        self._pool.start(QueryTask(self, channel, request, query))
+
+    def is_current(self, channel, request: int) -> bool:
+        return channel is None or self._latest.get(channel) == request
+
+    def db(self) -> DataHandler:
+        return self._db
+
+    def _deliver(self, channel, request: int, result, error):
+        on_result, on_error = self._callbacks.pop(request)
+        if not self._callbacks:
+            self.busy_changed.emit(False)
+
+        if not self.is_current(channel, request):
+            return
+        
+        if error is None:
+            on_result(result)
+        elif on_error is not None:
+            on_error(error)
+
+    def shutdown(self):
+        self._pool.waitForDone()
+
+class QueryTask(QRunnable):
+    def __init__(self, executor: QueryExecutor, channel, request: int, query):
+        super().__init__()
+        self._executor = executor
+        self._channel = channel
+        self._request = request
+        self._query = query
+
+    def run(self):
+        result, error = None, None
+
+        ### Whatever the query raises, the request is settled, so that its channel and the busy state are released.
+        try:
+            if self._executor.is_current(self._channel, self._request):
+                result = self._query(self._executor.db())
+        except Exception as exception:
+            error = describe_error(exception)
+        finally:
+            self._executor._done.emit(self._channel, self._request, result, error)
+
+## Worker thread for importing files. It writes through the shared DataHandler a chunk at a time, so records can still be 
+## entered meanwhile.
+class ImportWorker(QThread):
+    progress = pyqtSignal(dict)
+    imported = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db: DataHandler, file_path: str, rejected_path = None):
+        super().__init__()
+        self._db = db
+        self._file_path = file_path
+        self._rejected_path = rejected_path
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            stats = self._db.import_file(self._file_path, progress = self._report, rejected_path = self._rejected_path)
+        except Exception as error:
+            self.failed.emit(describe_error(error))
+        else:
+            self.imported.emit(stats)
+
+    def _report(self, stats: dict) -> bool:
+        self.progress.emit(stats)
+        return not self._cancelled
+
+## Worker thread for saving records to a file, reading a snapshot of the database through the shared DataHandler as well.
+class ExportWorker(QThread):
+    progress = pyqtSignal(int, int)
+    exported = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db: DataHandler, file_path: str, filters: dict):
+        super().__init__()
+        self._db = db
+        self._file_path = file_path
+        self._filters = filters
+        self._cancelled = False
+        self._total = 0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            self._total = self._db.count_records(**self._filters)
+            stats = self._db.export_records(self._file_path, **self._filters, progress = self._report)
+        except Exception as error:
+            self.failed.emit(describe_error(error))
+        else:
+            self.exported.emit(stats)
+
+    def _report(self, exported: int) -> bool:
+        self.progress.emit(exported, self._total)
+        return not self._cancelled
+
+def describe_error(error: Exception) -> str:
+    """
+    The message of `error` for the user; the name of its type when it has none (e.g. `KeyError` has only the key).
+    """
+    if isinstance(error, (ValueError, TypeError, OSError, sql.Error)) and str(error):
+        return str(error)
+    
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+## Timed by the diagnostics (see `diagnostics.py`): the table models of the pages, and the rendering of the summary
+DIAGNOSTICS.register(TableModel, ["data"])
+DIAGNOSTICS.register(EditableTableModel, ["data"])
+DIAGNOSTICS.register(PagedTableModel, ["fetchMore"])
+DIAGNOSTICS.register(DashBoard, ["_show_summary"])
\ No newline at end of file
@@ -1,82 +1,987 @@
 import sqlite3 as sql
 import datetime as dt
+import numpy as np
 import pandas as pd
+import csv
+import json
+import os
+import time
+import threading
+
+import heapq
+import itertools
 
 from typing import List
+from collections import OrderedDict, Counter, defaultdict
 from categories import CATEGORIES
-import random
+from diagnostics import DIAGNOSTICS
+from snapshots import SnapshotStore, format_days
+
+## The triggers keeping the `daily_totals` rollup in step with a ledger table: the ones of `expenditure`, and the TEMP 
+## triggers of the year shards of a partitioned ledger (see `YearShards`), which only exist on the writer connection.
+ROLLUP_TRIGGERS = """
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO daily_totals (Date, Category, Type, Amount, Count)
+        VALUES (NEW.Date, NEW.Category, NEW.Type, NEW.Amount, 1)
+        ON CONFLICT (Date, Category, Type) DO UPDATE SET Amount = Amount + excluded.Amount, Count = Count + 1;
+    END;
+
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table}
+    BEGIN
+        UPDATE daily_totals SET Amount = Amount - OLD.Amount, Count = Count - 1
+        WHERE Date = OLD.Date AND Category = OLD.Category AND Type = OLD.Type;
+        DELETE FROM daily_totals 
+        WHERE Date = OLD.Date AND Category = OLD.Category AND Type = OLD.Type AND Count <= 0;
+    END;
+
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF Date, Category, Amount, Type ON {table}
+    BEGIN
+        UPDATE daily_totals SET Amount = Amount - OLD.Amount, Count = Count - 1
+        WHERE Date = OLD.Date AND Category = OLD.Category AND Type = OLD.Type;
+        DELETE FROM daily_totals 
+        WHERE Date = OLD.Date AND Category = OLD.Category AND Type = OLD.Type AND Count <= 0;
+        INSERT INTO daily_totals (Date, Category, Type, Amount, Count)
+        VALUES (NEW.Date, NEW.Category, NEW.Type, NEW.Amount, 1)
+        ON CONFLICT (Date, Category, Type) DO UPDATE SET Amount = Amount + excluded.Amount, Count = Count + 1;
+    END;
+"""
+
+## The triggers marking the snapshot of a year (see `YearSnapshot`) as stale when a record of the year is written, on 
+## `expenditure` and (as TEMP triggers) on the year shards. See `snapshot_triggers`.
+SNAPSHOT_TRIGGERS = """
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_snapshot_insert AFTER INSERT ON {table}
+    BEGIN
+        UPDATE snapshots SET Stale = 1 WHERE Year = {new_year} AND Stale = 0;
+    END;
+
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_snapshot_delete AFTER DELETE ON {table}
+    BEGIN
+        UPDATE snapshots SET Stale = 1 WHERE Year = {old_year} AND Stale = 0;
+    END;
+
+    CREATE {temp}TRIGGER IF NOT EXISTS {name}_snapshot_update AFTER UPDATE ON {table}
+    BEGIN
+        UPDATE snapshots SET Stale = 1 WHERE Year IN ({old_year}, {new_year}) AND Stale = 0;
+    END;
+"""
+
+## Dates are stored as day numbers (days since 1970-01-01) and amounts as integer cents since migration 8. These SQLite 
+## expressions convert the "%Y-%m-%d" dates and the decimal amounts (e.g. of the staging table), and give the year of a date.
+DAY_OF_TEXT = "CAST(julianday({date}) - 2440587.5 AS INTEGER)"
+CENTS_OF_REAL = "CAST(round({amount} * 100) AS INTEGER)"
+YEAR_OF_DAY = "CAST(strftime('%Y', {date} + 2440587.5) AS INTEGER)"
+YEAR_OF_TEXT = "CAST(substr({date}, 1, 4) AS INTEGER)"
+EPOCH = dt.date(1970, 1, 1)
+
+## The columns of the staging table (which keeps the records as entered, with their category ids) converted for the ledger
+STAGED_COLUMNS = f"id, {DAY_OF_TEXT.format(date = 'Date')}, Category, {CENTS_OF_REAL.format(amount = 'Amount')}, Type"
+
+def snapshot_triggers(temp: str, name: str, table: str, year_of = YEAR_OF_DAY) -> str:
+    return SNAPSHOT_TRIGGERS.format(temp = temp, name = name, table = table, 
+                                    new_year = year_of.format(date = "NEW.Date"), old_year = year_of.format(date = "OLD.Date"))
+
+def sql_literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+## Migration 8 of the ledger table, also applied to the year shards: the dates become day numbers and the amounts cents, 
+## and the amount with the sign of its type (revenues negative) is stored, so that filters, sorts and sums run on integers.
+INTEGER_LEDGER = f"""
+    CREATE TABLE expenditure_v8 (
+        id INTEGER PRIMARY KEY,
+        Date INTEGER NOT NULL,
+        Category TEXT NOT NULL,
+        Amount INTEGER NOT NULL,
+        Type TEXT NOT NULL,
+        Signed INTEGER GENERATED ALWAYS AS (CASE WHEN Type = 'Rev' THEN -Amount ELSE Amount END) STORED
+    );
+
+    INSERT INTO expenditure_v8 (id, Date, Category, Amount, Type)
+    SELECT id, {DAY_OF_TEXT.format(date = "Date")}, Category, {CENTS_OF_REAL.format(amount = "Amount")}, Type 
+    FROM expenditure ORDER BY id;
+
+    DROP TABLE expenditure;
+    ALTER TABLE expenditure_v8 RENAME TO expenditure;
+
+    CREATE INDEX idx_expenditure_date ON expenditure (Date, Type, Category, Amount, Signed);
+    CREATE INDEX idx_expenditure_category ON expenditure (Category, Type, Date, Amount, Signed);
+"""
+
+## Migration 9 of the ledger table: the category names become the ids of the `categories` table (in the schema `schema`), 
+## with a foreign key in the main database (SQLite has none across databases, so not in the year shards).
+CATEGORY_LEDGER = """
+    CREATE TABLE expenditure_v9 (
+        id INTEGER PRIMARY KEY,
+        Date INTEGER NOT NULL,
+        Category INTEGER NOT NULL{references},
+        Amount INTEGER NOT NULL,
+        Type TEXT NOT NULL,
+        Signed INTEGER GENERATED ALWAYS AS (CASE WHEN Type = 'Rev' THEN -Amount ELSE Amount END) STORED
+    );
+
+    INSERT INTO expenditure_v9 (id, Date, Category, Amount, Type)
+    SELECT id, Date, (SELECT id FROM {schema}categories WHERE Name = expenditure.Category), Amount, Type 
+    FROM expenditure ORDER BY id;
+
+    DROP TABLE expenditure;
+    ALTER TABLE expenditure_v9 RENAME TO expenditure;
+
+    CREATE INDEX idx_expenditure_date ON expenditure (Date, Type, Category, Amount, Signed);
+    CREATE INDEX idx_expenditure_category ON expenditure (Category, Type, Date, Amount, Signed);
+"""
+
+## Schema migrations, applied in order. Once the i-th script (counting from 1) has been applied,
+## the database is at version i.
+MIGRATIONS = [
+    ## 1: Ledger table
+    """
+    CREATE TABLE IF NOT EXISTS expenditure (
+        id INTEGER PRIMARY KEY,
+        Date TEXT NOT NULL,
+        Category TEXT NOT NULL,
+        Amount REAL NOT NULL,
+        Type TEXT NOT NULL
+    );
+    """,
+
+    ## 2: Covering indexes for date range queries, and for category filters and groupings
+    """
+    CREATE INDEX IF NOT EXISTS idx_expenditure_date ON expenditure (Date, Type, Category, Amount);
+    CREATE INDEX IF NOT EXISTS idx_expenditure_category ON expenditure (Category, Type, Date, Amount);
+    """,
+
+    ## 3: Daily rollup for the grouped queries, kept in step with the ledger by triggers
+    """
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        Date TEXT NOT NULL,
+        Category TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        Amount REAL NOT NULL,
+        Count INTEGER NOT NULL,
+        PRIMARY KEY (Date, Category, Type)
+    ) WITHOUT ROWID;
+
+    DELETE FROM daily_totals;
+    INSERT INTO daily_totals (Date, Category, Type, Amount, Count)
+    SELECT Date, Category, Type, SUM(Amount), COUNT(*)
+    FROM expenditure
+    GROUP BY Date, Category, Type;
+    """ + ROLLUP_TRIGGERS.format(temp = "", name = "trg_expenditure", table = "expenditure"),
+
+    ## 4: Per-date sequence for allocating record ids
+    """
+    CREATE TABLE IF NOT EXISTS id_sequence (
+        Date TEXT PRIMARY KEY,
+        Next INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """,
+
+    ## 5: Staging area for the records entered in the current session, until they are saved to the ledger
+    """
+    CREATE TABLE IF NOT EXISTS staging (
+        Seq INTEGER PRIMARY KEY,
+        id INTEGER NOT NULL UNIQUE,
+        Date TEXT NOT NULL,
+        Category TEXT NOT NULL,
+        Amount REAL NOT NULL,
+        Type TEXT NOT NULL
+    );
+    """,
+
+    ## 6: Year shards of a partitioned ledger (see `YearShards`). The records of a closed year can't be changed anymore.
+    """
+    CREATE TABLE IF NOT EXISTS shards (
+        Year INTEGER PRIMARY KEY,
+        Closed INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+
+    ## 7: Columnar snapshots of past years (see `YearSnapshot`), read instead of the ledger until they are stale
+    """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        Year INTEGER PRIMARY KEY,
+        Version INTEGER NOT NULL,
+        Rows INTEGER NOT NULL,
+        Stale INTEGER NOT NULL DEFAULT 0
+    );
+    """ + snapshot_triggers("", "trg_expenditure", "expenditure", year_of = YEAR_OF_TEXT),
+
+    ## 8: Day numbers and cents (see `INTEGER_LEDGER`), in the ledger and in the rollup, which is converted rather than 
+    ##    rebuilt as it also sums the year shards. Dropping the ledger table dropped its triggers.
+    INTEGER_LEDGER + f"""
+    CREATE TABLE daily_totals_v8 (
+        Date INTEGER NOT NULL,
+        Category TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        Amount INTEGER NOT NULL,
+        Count INTEGER NOT NULL,
+        PRIMARY KEY (Date, Category, Type)
+    ) WITHOUT ROWID;
+
+    INSERT INTO daily_totals_v8 (Date, Category, Type, Amount, Count)
+    SELECT {DAY_OF_TEXT.format(date = "Date")}, Category, Type, {CENTS_OF_REAL.format(amount = "Amount")}, Count 
+    FROM daily_totals;
+
+    DROP TABLE daily_totals;
+    ALTER TABLE daily_totals_v8 RENAME TO daily_totals;
+    """ + ROLLUP_TRIGGERS.format(temp = "", name = "trg_expenditure", table = "expenditure") 
+        + snapshot_triggers("", "trg_expenditure", "expenditure"),
+
+    ## 9: Categories table (see `DataHandler.get_categories`), starting with the preset categories and those in use, whose 
+    ##    ids replace the names in the ledger and in the rollup. The snapshots hold names, so they are stale.
+    f"""
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        Name TEXT NOT NULL UNIQUE
+    );
+
+    INSERT OR IGNORE INTO categories (Name) VALUES {", ".join(f"({sql_literal(name)})" for name in CATEGORIES)};
+    INSERT OR IGNORE INTO categories (Name) 
+    SELECT Category FROM daily_totals UNION SELECT Category FROM staging ORDER BY 1;
+    """ + CATEGORY_LEDGER.format(schema = "", references = " REFERENCES categories (id)") + """
+    CREATE TABLE daily_totals_v9 (
+        Date INTEGER NOT NULL,
+        Category INTEGER NOT NULL,
+        Type TEXT NOT NULL,
+        Amount INTEGER NOT NULL,
+        Count INTEGER NOT NULL,
+        PRIMARY KEY (Date, Category, Type)
+    ) WITHOUT ROWID;
+
+    INSERT INTO daily_totals_v9 (Date, Category, Type, Amount, Count)
+    SELECT Date, (SELECT id FROM categories WHERE Name = daily_totals.Category), Type, Amount, Count 
+    FROM daily_totals;
+
+    DROP TABLE daily_totals;
+    ALTER TABLE daily_totals_v9 RENAME TO daily_totals;
+
+    UPDATE snapshots SET Stale = 1;
+    """ + ROLLUP_TRIGGERS.format(temp = "", name = "trg_expenditure", table = "expenditure") 
+        + snapshot_triggers("", "trg_expenditure", "expenditure"),
+
+    ## 10: Category ids in the staging table, so that the staged records are not left without a category when it's renamed
+    """
+    CREATE TABLE staging_v10 (
+        Seq INTEGER PRIMARY KEY,
+        id INTEGER NOT NULL UNIQUE,
+        Date TEXT NOT NULL,
+        Category INTEGER NOT NULL REFERENCES categories (id),
+        Amount REAL NOT NULL,
+        Type TEXT NOT NULL
+    );
+
+    INSERT INTO staging_v10 (Seq, id, Date, Category, Amount, Type)
+    SELECT Seq, id, Date, (SELECT id FROM categories WHERE Name = staging.Category), Amount, Type 
+    FROM staging;
+
+    DROP TABLE staging;
+    ALTER TABLE staging_v10 RENAME TO staging;
+    """,
+]
+
+## The schema of the year shards: the ledger table and its indexes. The rollup, the id sequence, the staging table and 
+## the categories stay in the main database, which is attached as `ledger` while the shards are migrated.
+SHARD_MIGRATIONS = MIGRATIONS[:2] + [INTEGER_LEDGER, CATEGORY_LEDGER.format(schema = "ledger.", references = "")]
+
+## Record ids are the date (YYYYMMDD) followed by a suffix of `ID_SUFFIX_DIGITS` digits, so that they are sortable by date.
+ID_SUFFIX_DIGITS = 4
+ID_SUFFIX_RANGE = 10 ** ID_SUFFIX_DIGITS
+
+## Settings of every connection. The database runs in WAL mode, so that readers never wait for the writer (nor the writer 
+## for readers); `synchronous = NORMAL` is safe in WAL mode and only syncs at checkpoints. Negative cache sizes are in KiB.
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -32_000,
+    "mmap_size": 256 * 1024 ** 2,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON"
+}
+## The period of each date for `get_period_summary`, as SQLite expressions on the day numbers, which the date functions 
+## take as Julian days once shifted by the Julian day of 1970-01-01. Weeks start on Monday, and are labelled by their first day.
+PERIOD_BUCKETS = {
+    "day": "date(Date + 2440587.5)",
+    "week": "date(Date + 2440587.5, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m', Date + 2440587.5)",
+    "quarter": "strftime('%Y', Date + 2440587.5) || '-Q' || ((CAST(strftime('%m', Date + 2440587.5) AS INTEGER) + 2) / 3)",
+    "year": "strftime('%Y', Date + 2440587.5)"
+}
+## Seconds to wait for another process holding the write lock, instead of failing with "database is locked".
+BUSY_TIMEOUT = 30
+## The year shards attached to a connection at a time. SQLite attaches at most 10 databases to a connection.
+MAX_ATTACHED_SHARDS = 8
 
 class DataHandler:
-    def __init__(self, db_name = "expenditrue.db"):
+    def __init__(self, db_name = "expenditrue.db", cache_size = 32, partitioned = False):
+        """
+        ## Parameters:
+        - `db_name`: `str`, default `"expenditrue.db"`. The database file.
+        - `cache_size`: `int`, default `32`. The number of query results kept in the cache.
+        - `partitioned`: `bool`, default `False`. Whether storing the records of each year in a file of its own (see 
+                         `YearShards`). The records of an existing ledger are moved to the year files, and a ledger with year 
+                         files stays partitioned.
+        """
         self._db_name = db_name
-        self._connection = sql.connect(db_name)
-        self._cursor = self._connection.cursor()
-        self._temp_rec = pd.DataFrame(columns = ["id", "Date", "Category", "Amount", "Type"])
-        self.create_rec_table()
 
-    def create_rec_table(self):
-        query = """
-        CREATE TABLE IF NOT EXISTS expenditure (
-            id INTEGER PRIMARY KEY,
-            Date TEXT NOT NULL,
-            Category TEXT NOT NULL,
-            Amount REAL NOT NULL,
-            Type TEXT NOT NULL
-        );
+        ### One writer connection, shared by all threads and serialized by `_write_lock`, and one read connection per 
+        ### thread (see `_reader`), so that the handler can be used from background threads.
+        self._connection = self._connect()
+        self._connection.execute("PRAGMA journal_mode = WAL;")
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+        ### Query results are cached until the next write to the database, through this handler (counted by 
+        ### `_generation`) or through another connection (detected with `PRAGMA data_version`).
+        self._cache = QueryCache(cache_size)
+        self._cache_lock = threading.Lock()
+        self._generation = 0
+        self.migrate()
+
+        ### The records entered but not yet saved to the ledger. Those staged by a previous session that didn't close 
+        ### properly (e.g. a crash) are recovered from the staging table.
+        self._staging = StagingBuffer(
+            self._connection.execute("SELECT id, Date, Category, Amount, Type FROM staging ORDER BY Seq;").fetchall()
+        )
+
+        ### The columnar snapshots of past years (see `snapshot_years`)
+        self._snapshots = SnapshotStore(db_name)
+
+        has_shards = self._connection.execute("SELECT COUNT(*) FROM shards;").fetchone()[0] > 0
+        self._shards = YearShards(db_name) if partitioned or has_shards else None
+        if self._shards is not None:
+            self._migrate_shards()
+            self._partition_ledger()
+
+    def migrate(self):
+        """
+        Upgrading the database schema to the latest version in `MIGRATIONS`.
+        The version of the database is tracked with `PRAGMA user_version`, so that each migration is applied only once.
         """
+        with self._write_lock:
+            self._migrate()
+
+    def _migrate(self):
+        if apply_migrations(self._connection, MIGRATIONS):
+            ### Refreshing the statistics, so that the query planner picks up the new indexes.
+            self._connection.execute("ANALYZE;")
+            self._connection.commit()
+
+    def schema_version(self) -> int:
+        return self._connection.execute("PRAGMA user_version;").fetchone()[0]
+
+    def _connect(self, read_only = False) -> sql.Connection:
+        ### Connections may be closed from another thread by `close_connection`; they are never used concurrently.
+        connection = sql.connect(self._db_name, timeout = BUSY_TIMEOUT, check_same_thread = False)
+
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            connection.execute(f"PRAGMA {pragma} = {value};")
+        
+        if read_only:
+            connection.execute("PRAGMA query_only = ON;")
+        
+        if DIAGNOSTICS.enabled:
+            connection.set_trace_callback(DIAGNOSTICS.tracer())
+
+        return connection
+
+    def _reader(self) -> sql.Connection:
+        """
+        The read connection of the calling thread, opened on its first query. It sees the last committed state of the 
+        database, and never waits for the writer.
+        """
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = self._local.connection = self._connect(read_only = True)
+            with self._readers_lock:
+                self._readers.append(connection)
+
+        return connection
+
+    def _written(self):
+        with self._cache_lock:
+            self._generation += 1
+
+    ##----- Categories -----##
+    def _categories(self) -> List[tuple]:
+        """
+        The (id, Name) pairs of the `categories` table, in the order of their ids. The records refer to their category by id, 
+        and the results have their categories in this order (see `category_names`).
+        """
+        return self._reader().execute("SELECT id, Name FROM categories ORDER BY id;").fetchall()
+
+    def _category_ids(self, names: List[str]) -> List[int]:
+        ids = {name: category_id for category_id, name in self._categories()}
+        unknown = [name for name in names if name not in ids]
+        if unknown:
+            raise ValueError(f"Unknown category {unknown[0]!r}.")
+        
+        return [ids[name] for name in names]
+
+    def get_categories(self) -> List[str]:
+        """
+        The names of the categories, in the order they were added: the preset categories of `CATEGORIES` first, which a new 
+        database starts with.
+        """
+        return [name for _, name in self._categories()]
+
+    def add_category(self, name: str) -> int:
+        """
+        Adding the category `name`. Returns its id, or raises a `ValueError` if it exists already.
+        """
+        name = validate_category_name(name)
+
+        with self._write_lock:
+            try:
+                with self._connection:
+                    category_id = self._connection.execute("INSERT INTO categories (Name) VALUES (?);", (name, )).lastrowid
+            except sql.IntegrityError:
+                raise ValueError(f"The category {name!r} exists already.") from None
+        
+        self._written()
+        return category_id
+
+    def rename_category(self, name: str, new_name: str):
+        """
+        Renaming the category `name` to `new_name`. Only its row of the `categories` table changes, as the records (and the 
+        snapshots) refer to it by id.
+        """
+        new_name = validate_category_name(new_name)
+
+        with self._write_lock:
+            try:
+                with self._connection:
+                    renamed = self._connection.execute("UPDATE categories SET Name = ? WHERE Name = ?;", 
+                                                       (new_name, name)).rowcount
+            except sql.IntegrityError:
+                raise ValueError(f"The category {new_name!r} exists already.") from None
+            
+            if not renamed:
+                raise ValueError(f"Unknown category {name!r}.")
+        
+        self._written()
+
+    ##----- Year shards of a partitioned ledger -----##
+    def _shard_years(self, connection: sql.Connection, dates: List[dt.date] = []) -> List[int]:
+        """
+        The years with a shard, overlapping `dates` (a start date and an end date, or `[]` for all years).
+        """
+        if not dates:
+            return [year for (year, ) in connection.execute("SELECT Year FROM shards ORDER BY Year;")]
+        
+        first, last = int(date_to_str(dates[0])[:4]), int(date_to_str(dates[1])[:4])
+        return [year for (year, ) in connection.execute("SELECT Year FROM shards WHERE Year BETWEEN ? AND ? ORDER BY Year;", 
+                                                        (first, last))]
+
+    def _ledger_tables(self, connection: sql.Connection, dates: List[dt.date] = []):
+        """
+        Yielding the tables to read the records in `dates` from, a batch at a time, each batch for one query: `expenditure`, 
+        or the shards overlapping `dates` in a partitioned ledger. The shards of a batch are attached to `connection` before 
+        it is yielded.
+        """
+        years = self._shard_years(connection, dates) if self._shards is not None else []
+        if not years:
+            yield ["expenditure"]
+            return
+
+        for batch in self._shards.batches(years):
+            self._shards.attach(connection, batch)
+            yield [self._shards.table(year) for year in batch]
+
+    def _prepare_shards(self, years: List[int]):
+        """
+        Creating the missing shards of `years` and attaching them to the writer, before writing to them. Must be called with 
+        the write lock, outside of transactions.
+        """
+        closed = {year for (year, ) in self._connection.execute("SELECT Year FROM shards WHERE Closed = 1;")}
+        if closed & set(years):
+            raise ValueError(f"The year {min(closed & set(years))} is closed, its records cannot be changed.")
+        
+        existing = set(self._shard_years(self._connection))
+        for year in sorted(set(years) - existing):
+            self._migrate_shard(year)
+            with self._connection:
+                self._connection.execute("INSERT OR IGNORE INTO shards (Year) VALUES (?);", (year, ))
+
+        self._shards.attach(self._connection, years, triggers = True)
+
+    def _migrate_shard(self, year: int) -> bool:
+        """
+        Creating the shard of `year`, or upgrading its schema to the latest version in `SHARD_MIGRATIONS`. The shard must not 
+        be attached to the writer. Returns whether any migration was applied.
+        """
+        shard = sql.connect(self._shards.path(year))
+        try:
+            shard.execute("PRAGMA journal_mode = WAL;")
+            shard.execute("ATTACH DATABASE ? AS ledger;", (self._db_name, ))
+            return apply_migrations(shard, SHARD_MIGRATIONS)
+        finally:
+            shard.close()
+
+    def _migrate_shards(self):
+        """
+        Upgrading the existing shards along with the main database, before they are attached. The closed ones are compacted 
+        again, as the migrations rewrite their ledger table.
+        """
+        with self._write_lock:
+            for year, closed in self._connection.execute("SELECT Year, Closed FROM shards ORDER BY Year;").fetchall():
+                if self._migrate_shard(year) and closed:
+                    shard = sql.connect(self._shards.path(year))
+                    try:
+                        shard.execute("VACUUM;")
+                        shard.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+                    finally:
+                        shard.close()
+
+    def _advance_id_sequence(self, record_ids: List[int]):
+        """
+        Moving the id sequence of the dates of `record_ids` past them, for the records stored in another shard than the one of 
+        the year of their id, where the id allocation doesn't look for them (see `_allocate_block`). Must be called with the 
+        write lock, in a transaction.
+        """
+        next_suffixes = {}
+        for record_id in record_ids:
+            prefix, suffix = divmod(int(record_id), ID_SUFFIX_RANGE)
+            next_suffixes[prefix] = max(next_suffixes.get(prefix, 0), suffix + 1)
+        
+        self._connection.executemany("""
+            INSERT INTO id_sequence (Date, Next) VALUES (?, ?)
+            ON CONFLICT (Date) DO UPDATE SET Next = MAX(Next, excluded.Next);
+        """, [(f"{prefix // 10 ** 4:04d}-{prefix // 100 % 100:02d}-{prefix % 100:02d}", suffix) 
+              for prefix, suffix in next_suffixes.items()])
+
+    def _partition_ledger(self):
+        """
+        Moving the records of the `expenditure` table (e.g. of a ledger that wasn't partitioned) to the year shards, a year 
+        per transaction.
+        """
+        with self._write_lock:
+            years = [year for (year, ) in self._connection.execute(
+                f"SELECT DISTINCT {YEAR_OF_DAY.format(date = 'Date')} FROM expenditure;"
+            )]
+            if not years:
+                return
+
+            ### The records whose date was edited to another year than the one of their id end up outside the shard where the 
+            ### id allocation looks for their id (see `_allocate_block`).
+            with self._connection:
+                self._advance_id_sequence([record_id for (record_id, ) in self._connection.execute(f"""
+                    SELECT id FROM expenditure WHERE id / {ID_SUFFIX_RANGE * 10 ** 4} != {YEAR_OF_DAY.format(date = 'Date')};
+                """)])
+
+            for year in years:
+                self._prepare_shards([year])
+                stale = self._connection.execute("SELECT Stale FROM snapshots WHERE Year = ?;", (year, )).fetchone()
+                with self._connection:
+                    self._connection.execute(f"""
+                        INSERT INTO {self._shards.table(year)} (id, Date, Category, Amount, Type)
+                        SELECT id, Date, Category, Amount, Type FROM main.expenditure WHERE Date BETWEEN ? AND ?;
+                    """, year_days(year))
+                    self._connection.execute("DELETE FROM main.expenditure WHERE Date BETWEEN ? AND ?;", year_days(year))
+
+                    ### Moving the records doesn't change them, so a snapshot of the year stays up to date.
+                    if stale is not None:
+                        self._connection.execute("UPDATE snapshots SET Stale = ? WHERE Year = ?;", (stale[0], year))
+
+        self._written()
+
+    def _locate_records(self, record_ids: List[int]) -> dict:
+        """
+        The shard of each existing record of `record_ids`, as a dict of the years and their record ids. Records are looked 
+        up in the shard of the year in their id first, which is the one they were inserted into.
+        Must be called with the write lock, outside of transactions.
+        """
+        remaining = set(record_ids)
+        years = self._shard_years(self._connection)
+        id_years = {record_id // (ID_SUFFIX_RANGE * 10 ** 4) for record_id in remaining}
+        located = {}
+
+        for year in sorted(years, key = lambda year: year not in id_years):
+            if not remaining:
+                break
+
+            self._shards.attach(self._connection, [year], triggers = True)
+            found = [record_id for (record_id, ) in self._connection.execute(
+                f"SELECT id FROM {self._shards.table(year)} WHERE id IN (SELECT value FROM json_each(?));", 
+                (json.dumps(sorted(remaining)), )
+            )]
 
-        self._cursor.execute(query)
+            if found:
+                located[year] = found
+                remaining.difference_update(found)
+        
+        return located
+
+    def _insert_rows(self, rows: List[tuple]):
+        """
+        Inserting (id, Date, Category, Amount, Type) rows as stored (see `encode_records`) into the ledger in one transaction, 
+        or in a partitioned ledger into their year shards, in one transaction per batch of shards.
+        """
+        query = "INSERT INTO {table} (id, Date, Category, Amount, Type) VALUES (?, ?, ?, ?, ?);"
+
+        with self._write_lock:
+            if self._shards is None:
+                with self._connection:
+                    self._connection.executemany(query.format(table = "expenditure"), rows)
+                return
+
+            ### The rows whose id isn't of their year (e.g. ids taken over from another ledger) are not found by the id 
+            ### allocation (see `_allocate_block`).
+            with self._connection:
+                self._advance_id_sequence([row[0] for row in rows if id_year(row[0]) != day_year(row[1])])
+
+            by_year = defaultdict(list)
+            for row in rows:
+                by_year[day_year(row[1])].append(row)
+            
+            for years in self._shards.batches(sorted(by_year)):
+                self._prepare_shards(years)
+                with self._connection:
+                    for year in years:
+                        self._connection.executemany(query.format(table = self._shards.table(year)), by_year[year])
+
+    def is_partitioned(self) -> bool:
+        return self._shards is not None
+
+    def close_year(self, year: int):
+        """
+        Closing a year of a partitioned ledger: its records cannot be changed anymore, and its shard is compacted, so that 
+        the file can be backed up once and for all. The year is also snapshotted (see `snapshot_years`), as its snapshot 
+        never gets stale.
+        """
+        if self._shards is None:
+            raise ValueError("Only the years of a partitioned ledger can be closed.")
+
+        with self._write_lock:
+            if year not in self._shard_years(self._connection):
+                raise ValueError(f"The ledger has no records in {year}.")
+            
+            self._shards.attach(self._connection, [year], triggers = True)
+            with self._connection:
+                self._connection.execute("UPDATE shards SET Closed = 1 WHERE Year = ?;", (year, ))
+
+            schema = self._shards.schema(year)
+            self._connection.execute(f"VACUUM {schema};")
+            self._connection.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE);")
+
+        self.snapshot_years([year])
+
+    ##----- Columnar snapshots of past years -----##
+    def snapshot_years(self, years: List[int] = None) -> List[int]:
+        """
+        Writing the columnar snapshots (see `YearSnapshot`) of `years`, by default of the years before the current one, from 
+        which `get_records` then reads their records with NumPy instead of SQLite. Once a record of a year is written, its 
+        snapshot is stale and the year is read from SQLite again, until it's snapshotted again.
+        Returns the years snapshotted, leaving out the ones with an up-to-date snapshot and the ones without records.
+        """
+        with self._write_lock:
+            ledger_years = [year for (year, ) in self._connection.execute(
+                f"SELECT DISTINCT {YEAR_OF_DAY.format(date = 'Date')} FROM daily_totals;"
+            )]
+            if years is None:
+                years = [year for year in ledger_years if year < dt.date.today().year]
+            
+            fresh = {year for (year, ) in self._connection.execute("SELECT Year FROM snapshots WHERE Stale = 0;")}
+            snapshotted = [year for year in sorted(set(years) & set(ledger_years) - fresh) if self._snapshot_year(year)]
+
+        self._written()
+        return snapshotted
+
+    def _snapshot_year(self, year: int) -> bool:
+        """
+        Writing a new version of the snapshot of `year`, in a write transaction, so that no record of the year can be 
+        written meanwhile. Must be called with the write lock, outside of transactions.
+        """
+        table = "expenditure"
+        if self._shards is not None:
+            if year not in self._shard_years(self._connection):
+                return False
+            
+            self._shards.attach(self._connection, [year], triggers = True)
+            table = self._shards.table(year)
+
+        self._connection.execute("BEGIN IMMEDIATE;")
+        try:
+            version = self._connection.execute("SELECT MAX(Version) FROM snapshots WHERE Year = ?;", (year, )).fetchone()[0]
+            version = (version or 0) + 1
+
+            cursor = self._connection.execute(f"""
+                SELECT id, Date, Category, Amount, Type FROM {table} WHERE Date BETWEEN ? AND ? ORDER BY Date, id;
+            """, year_days(year))
+            rows = self._snapshots.write(year, version, iter(lambda: cursor.fetchmany(100_000), []))
+
+            if rows:
+                self._connection.execute("""
+                    INSERT INTO snapshots (Year, Version, Rows, Stale) VALUES (?, ?, ?, 0)
+                    ON CONFLICT (Year) DO UPDATE SET Version = excluded.Version, Rows = excluded.Rows, Stale = 0;
+                """, (year, version, rows))
+            else:
+                self._connection.execute("DELETE FROM snapshots WHERE Year = ?;", (year, ))
+            
+        except Exception:
+            self._connection.rollback()
+            raise
+        
         self._connection.commit()
+        self._snapshots.remove(year, keep = version if rows else None)
+        return rows > 0
+
+    def drop_snapshots(self, years: List[int] = None):
+        """
+        Removing the snapshots of `years` (by default, all of them), whose records are then read from SQLite.
+        """
+        with self._write_lock:
+            if years is None:
+                years = [year for (year, ) in self._connection.execute("SELECT Year FROM snapshots;")]
+            
+            with self._connection:
+                self._connection.executemany("DELETE FROM snapshots WHERE Year = ?;", [(year, ) for year in years])
+            
+            for year in years:
+                self._snapshots.remove(year)
+        
+        self._written()
+
+    def _snapshot_segments(self, dates: List[dt.date] = []) -> List[tuple]:
+        """
+        Splitting the date range `dates` (`[]` for all dates) into the years with an up-to-date snapshot and the ranges in 
+        between, in date order. Returns (snapshot, [start date, end date]) pairs, where the snapshot is `None` for the ranges 
+        to read from SQLite; a single `(None, dates)` pair if no snapshot is in the range.
+        """
+        first, last = (date_to_str(dates[0]), date_to_str(dates[1])) if dates else ("0001-01-01", "9999-12-31")
+        segments = []
+        start = first
+
+        for year, version in self._reader().execute("SELECT Year, Version FROM snapshots WHERE Stale = 0 ORDER BY Year;"):
+            year_first, year_last = year_range(year)
+            if year_last < first or year_first > last:
+                continue
+
+            try:
+                snapshot = self._snapshots.open(year, version)
+            except OSError:
+                ### A missing snapshot (e.g. removed by hand) is read from SQLite.
+                continue
+
+            if start < year_first:
+                segments.append((None, [start, year_range(year - 1)[1]]))
+            segments.append((snapshot, [max(first, year_first), min(last, year_last)]))
+            start = year_range(year + 1)[0]
+
+        if not segments:
+            return [(None, dates)]
+        
+        if start <= last:
+            segments.append((None, [start, last]))
+        
+        return segments
     
     def _add_record(self, date: dt.date, category: str, amount: float, type_: str):
-        record_id = generate_id(date)
-        date = dt.date.strftime(date, "%Y-%m-%d")
-
         if type_ not in ["Exp", "Rev"]:
             raise ValueError(f"type_ argument must be either 'Exp' or 'Rev', {type_} instead.")
         
+        category_id = self._category_ids([category])[0]
+        record_id = self.allocate_ids([date])[0]
+        year = int(date_to_str(date)[:4])
+        
         query = """
-        INSERT INTO expenditure (id, Date, Category, Amount, Type)
+        INSERT INTO {table} (id, Date, Category, Amount, Type)
         VALUES (?, ?, ?, ?, ?);
         """
 
-        self._cursor.execute(query, (record_id, date, category, amount, type_))
+        with self._write_lock:
+            table = "expenditure"
+            if self._shards is not None:
+                self._prepare_shards([year])
+                table = self._shards.table(year)
 
-        ## Perhaps don't need commit every time after insertion.
-        self._connection.commit()
+            self._connection.execute(query.format(table = table), (record_id, to_day(date), category_id, to_cents(amount), type_))
 
-    def _add_records(self, records = None):
-        if records is not None:
-            if not isinstance(records, pd.DataFrame):
-                raise TypeError("The records must be pd.DataFrame to insert into the database.")
+            ## Perhaps don't need commit every time after insertion.
+            self._connection.commit()
+        
+        self._written()
+
+    def _add_records(self):
+        """
+        Moving the staged records (see `add_temp_rec`) from the staging table to the ledger in one transaction. The staged 
+        records keep their dates and amounts as entered, and are converted to day numbers and cents on the way.
+        """
+        with self._write_lock:
+            self.flush_staging()
+            if self._shards is None:
+                with self._connection:
+                    self._connection.execute(f"""
+                        INSERT INTO expenditure (id, Date, Category, Amount, Type)
+                        SELECT {STAGED_COLUMNS} FROM staging ORDER BY Seq;
+                    """)
+                    self._connection.execute("DELETE FROM staging;")
+            else:
+                self._move_staging_to_shards()
             
-            records.to_sql("expenditure", self._connection, if_exists = "append", index = False)
+            self._staging.clear()
         
-        else:
-            self._temp_rec.to_sql("expenditure", self._connection, if_exists = "append", index = False)
+        self._written()
 
-    def add_temp_rec(self, date: dt.date, category: str, amount: float, type_: str) -> pd.DataFrame:
-        record_id = generate_id(date)
+    def add_records(self, records: pd.DataFrame) -> int:
+        """
+        Inserting many records at once, e.g. generated ledgers (see `ledger_generator.py`), in one transaction (see 
+        `_insert_rows`). Unlike `import_file`, the records are not validated, except for their categories.
+        ## Parameters:
+        - `records`: `pd.DataFrame`. The records, with the columns Date (as "%Y-%m-%d"), Category, Amount and Type, and 
+                     optionally id. Without an id column, the records are given new ids (see `allocate_ids`).
+        Returns the number of inserted records. A `ValueError` is raised for an unknown category, before anything is inserted.
+        """
+        if not isinstance(records, pd.DataFrame):
+            raise TypeError("The records must be pd.DataFrame to insert into the database.")
+        
+        with self._write_lock:
+            if "id" in records.columns:
+                ids = records["id"].tolist()
+            else:
+                ids = self.allocate_ids(records["Date"].tolist())
+            
+            encoded = encode_records(records, self._categories())
+            self._insert_rows(list(zip(ids, encoded["Date"].tolist(), encoded["Category"].tolist(), 
+                                       encoded["Amount"].tolist(), encoded["Type"].tolist())))
+        
+        self._written()
+
+        return len(records)
+
+    def _move_staging_to_shards(self):
+        ### One transaction per batch of shards; the batches are ranges of years, so a batch's records are a range of dates.
+        years = [int(year) for (year, ) in self._connection.execute("SELECT DISTINCT substr(Date, 1, 4) FROM staging;")]
+
+        for batch in self._shards.batches(sorted(years)):
+            self._prepare_shards(batch)
+            with self._connection:
+                for year in batch:
+                    self._connection.execute(f"""
+                        INSERT INTO {self._shards.table(year)} (id, Date, Category, Amount, Type)
+                        SELECT {STAGED_COLUMNS} FROM staging WHERE Date BETWEEN ? AND ? ORDER BY Seq;
+                    """, year_range(year))
+                
+                self._connection.execute("DELETE FROM staging WHERE Date BETWEEN ? AND ?;", 
+                                         (year_range(batch[0])[0], year_range(batch[-1])[1]))
 
+    def add_temp_rec(self, date: dt.date, category: str, amount: float, type_: str) -> pd.DataFrame:
+        """
+        Staging a record entered by the user, and returning all the staged records. The record is appended to the 
+        `StagingBuffer` in memory, and made durable by the next `flush_staging`.
+        """
         if type_ not in ["Exp", "Rev"]:
             raise ValueError(f"type_ argument must be either 'Exp' or 'Rev', {type_} instead.")
         
-        temp_df = pd.DataFrame({
-            "id": [record_id],
-            "Date": [date],
-            "Category": [category],
-            "Amount": [amount],
-            "Type": [type_]
-        })
+        ### The staged records refer to their category by id, like the ledger, so they follow a renamed category.
+        category_id = self._category_ids([category])[0]
+        record_id = self.allocate_ids([date])[0]
+        self._staging.append((record_id, date_to_str(date), category_id, amount, type_))
+
+        return self._staging.frame(self._categories())
+
+    def flush_staging(self, wait = True) -> bool:
+        """
+        Writing the records staged since the last flush to the staging table, in one transaction.
+        ## Parameters:
+        - `wait`: `bool`, default `True`. Whether to wait for a write in progress (e.g. an import). Otherwise the flush is 
+                  skipped and `False` is returned, so that a timer in the GUI thread never blocks.
+        """
+        rows = self._staging.pending()
+        if not rows:
+            return True
+        
+        if not self._write_lock.acquire(blocking = wait):
+            return False
+        
+        try:
+            with self._connection:
+                self._connection.executemany("""
+                    INSERT INTO staging (id, Date, Category, Amount, Type)
+                    VALUES (?, ?, ?, ?, ?);
+                """, rows)
+            
+            self._staging.mark_flushed(len(rows))
+        finally:
+            self._write_lock.release()
+
+        return True
+
+    def allocate_ids(self, dates: List[dt.date]) -> List[int]:
+        """
+        Allocating a unique record id for each date in `dates`, e.g. for a bulk insertion.
+        The ids of a date are handed out in increasing order from the `id_sequence` table, skipping the ids already 
+        used in the ledger, so that they never collide with existing (also randomly generated) ids.
+        """
+        dates = [date_to_str(date) for date in dates]
+        counts = Counter(dates)
+        blocks = {}
+
+        with self._write_lock:
+            ### In a partitioned ledger, the ids in use are looked up in the shards of the dates' years, which are attached 
+            ### (outside of transactions) a batch of years at a time.
+            batches = [sorted(counts)]
+            if self._shards is not None:
+                existing = set(self._shard_years(self._connection))
+                years = sorted({int(date[:4]) for date in counts})
+                batches = [[date for date in sorted(counts) if int(date[:4]) in batch] for batch in self._shards.batches(years)]
 
-        self._temp_rec = safe_concat(self._temp_rec, temp_df)
+            for batch in batches:
+                if self._shards is not None:
+                    self._shards.attach(self._connection, sorted({int(date[:4]) for date in batch} & existing), triggers = True)
 
-        return self._temp_rec
+                ### Taking the write lock of the database upfront, so that another process cannot hand out the same ids.
+                self._connection.execute("BEGIN IMMEDIATE;")
+                try:
+                    blocks.update({date: iter(self._allocate_block(date, counts[date])) for date in batch})
+                except (ValueError, sql.Error):
+                    self._connection.rollback()
+                    raise
+                
+                self._connection.commit()
 
-    def get_temp_rec(self):
-        return self._temp_rec
+        return [next(blocks[date]) for date in dates]
+
+    def _allocate_block(self, date: str, count: int) -> List[int]:
+        prefix = int(date.replace("-", "")) * ID_SUFFIX_RANGE
+
+        row = self._connection.execute("SELECT Next FROM id_sequence WHERE Date = ?;", (date, )).fetchone()
+        start = row[0] if row else 0
+
+        ### In a partitioned ledger, the ids of a date are looked up in the shard of its year (attached by `allocate_ids`); 
+        ### the records stored in another shard have moved the sequence past their ids (see `_advance_id_sequence`).
+        table = "expenditure"
+        if self._shards is not None:
+            year = int(date[:4])
+            table = self._shards.table(year) if year in self._shard_years(self._connection, [date, date]) else None
+
+        used = set()
+        if table is not None:
+            used = {record_id for (record_id, ) in self._connection.execute(f"SELECT id FROM {table} WHERE id BETWEEN ? AND ?;", 
+                                                                             (prefix + start, prefix + ID_SUFFIX_RANGE - 1))}
+
+        ids = []
+        for suffix in range(start, ID_SUFFIX_RANGE):
+            if len(ids) == count:
+                break
+            if prefix + suffix not in used:
+                ids.append(prefix + suffix)
+
+        if len(ids) < count:
+            raise ValueError(f"Cannot allocate {count} more ids on {date}, at most {ID_SUFFIX_RANGE} records per day are supported.")
+        
+        self._connection.execute("""
+            INSERT INTO id_sequence (Date, Next) VALUES (?, ?)
+            ON CONFLICT (Date) DO UPDATE SET Next = excluded.Next;
+        """, (date, ids[-1] - prefix + 1))
+
+        return ids
+
+    def get_temp_rec(self) -> pd.DataFrame:
+        return self._staging.frame(self._categories())
     
-    def get_records(self, dates: List[dt.date] = [], categories: List[str] = CATEGORIES, 
+    def get_records(self, dates: List[dt.date] = [], categories: List[str] = None, 
                     group_date = False, group_category = False, 
                     include_id = False, 
                     include_exp = True, include_rev = True) -> pd.DataFrame:
@@ -87,120 +992,715 @@ class DataHandler:
         - `dates`: `List[dt.date]`, default `[]`. If it's specified, it must include a start date (`dates[0]`) and an end date (`dates[1]`)
                    and the method returns the records from the start date to the end date (both included); otherwise, the date 
                    range is by default the whole date range.
-        - `categories`: `List[str]`, default the preset category list `CATEGORIES`. The method returns the records where the Category is in
-                        `categories`.
+        - `categories`: `List[str]`, default `None`. The method returns the records where the Category is in `categories`; 
+                        `None` means all categories.
         - `group_date`: `bool`, default `False`. Whether grouping the data by Date.
         - `group_category`: `bool`, default `False`. Whether grouping the data by Category.
         - `include_id`: `bool`, default `False`. Whether returning the id of the records.
+        - `include_exp`, `include_rev`: `bool`, default `True`. Which types of records to return. When both are included, 
+                                        revenues are returned as negative amounts.
+        The Category column is a `pd.Categorical` of all the categories (see `get_categories`), in their order; the grouped 
+        records are sorted in this order too.
         """
 
-        if dates:
-            query = """
-                SELECT id, Date, Category, Amount, Type
-                FROM expenditure 
-                WHERE Date BETWEEN ? AND ?
-            """
-            self._cursor.execute(query, (dates[0], dates[1]))
+        query, params, column_names = build_records_query(dates, categories, 
+                                                          group_date, group_category, 
+                                                          include_id, 
+                                                          include_exp, include_rev)
         
-        else:
-            query = """
-                SELECT id, Date, Category, Amount, Type
-                FROM expenditure 
-            """
-            self._cursor.execute(query)
+        return self._fetch_frame(query, params, column_names, 
+                                 fetch = lambda: self._read_records(dates, categories, group_date, group_category, 
+                                                                    include_id, include_exp, include_rev))
 
-        column_names = [desc[0] for desc in self._cursor.description]
-        temp = pd.DataFrame(self._cursor.fetchall(), columns = column_names)
-        temp = temp.query("Category in @categories").reset_index(drop = True)
+    def _read_records(self, dates: List[dt.date], categories: List[str], group_date: bool, group_category: bool, 
+                      include_id: bool, include_exp: bool, include_rev: bool) -> pd.DataFrame:
+        """
+        The result of `get_records`, read from the snapshots of the years that have an up-to-date one (see 
+        `_snapshot_segments`), and from SQLite otherwise: from `daily_totals` if grouped, and from the ledger tables if not. 
+        The rows of SQLite are decoded (see `decode_rows`) before they are merged with those of the snapshots.
+        """
+        types = (["Exp"] if include_exp else []) + (["Rev"] if include_rev else [])
+        group_columns = (["Date"] if group_date else []) + (["Category"] if group_category else [])
+        segments = self._snapshot_segments(dates)
+        frames = []
 
-        ### Whether including the id column.
-        if not include_id:
-            temp = temp.drop("id", axis = 1)
+        ### The snapshots filter the category ids. Unknown categories select nothing, as in SQLite.
+        all_categories = self._categories()
+        category_ids = None
+        if categories is not None:
+            ids = {name: category_id for category_id, name in all_categories}
+            category_ids = [ids[name] for name in categories if name in ids]
 
-        if group_date and group_category:
-            records = temp.groupby(["Date", "Category", "Type"])["Amount"].sum()\
-                                                                  .reset_index()\
-                                                                  .sort_values(by = "Date", ascending = True)\
-                                                                  .reset_index(drop = True)
+        for snapshot, segment in segments:
+            if snapshot is not None:
+                first_day, last_day = to_day(segment[0]), to_day(segment[1])
+                if group_columns:
+                    frames.append(snapshot.totals(first_day, last_day, category_ids, types, group_date, group_category))
+                else:
+                    frames.append(snapshot.records(first_day, last_day, category_ids, types, include_id))
             
-        elif group_date and (not group_category):
-            records = temp.groupby(["Date", "Type"])["Amount"].sum()\
-                                                      .reset_index()\
-                                                      .sort_values(by = "Date", ascending = True)\
-                                                      .reset_index(drop = True)
+            elif group_columns:
+                ### With the Type, so that the sums of each type can be added up with those of the snapshots.
+                query, params, column_names = build_records_query(segment, categories, group_date, group_category, 
+                                                                  include_exp = include_exp, include_rev = include_rev, 
+                                                                  group_type = len(segments) > 1)
+                frames.append(decode_rows(self._fetch_rows(query, params), column_names))
             
+            else:
+                column_names = (["id"] if include_id else []) + ["Date", "Category", "Amount"]
+                rows = self._read_ledger(segment, categories = categories, include_id = include_id, 
+                                         include_exp = include_exp, include_rev = include_rev)
+                frames.append(decode_rows(rows, column_names))
+
+        if len(frames) == 1:
+            records = frames[0]
+        else:
+            records = pd.concat([frame for frame in frames if len(frame)] or frames[:1], ignore_index = True)
+        
+        if group_columns and "Type" in records.columns:
+            ### The groups of different segments only overlap when grouping by Category alone.
+            records = records.groupby(group_columns + ["Type"], sort = True)["Amount"].sum().reset_index()
+            records = records.drop(columns = "Type")
+        
+        if "Category" in records.columns:
+            records["Category"] = category_names(records["Category"].to_numpy(), all_categories)
+        
+        return records
+
+    def get_all_records(self, include_id = False, include_exp = True, include_rev = True):
+        return self.get_records(categories = None, 
+                                include_id = include_id, 
+                                include_exp = include_exp, 
+                                include_rev = include_rev)
+
+    def get_summary(self, dates: List[dt.date], categories: List[str] = None, 
+                    group_date = False, group_category = True, 
+                    include_exp = True, include_rev = False, 
+                    granularity = "day"):
+        """
+        Retrieving the data of the summary page: the grouped records (see `get_records`), and the total amount of each 
+        category for the pie chart. With `group_date` and a `granularity` other than `"day"`, the records are grouped by 
+        period instead (see `get_period_summary`).
+        """
+
+        if group_date and granularity != "day":
+            ### No `dates` means the whole ledger, as in `get_records`.
+            types = (["Exp"] if include_exp else []) + (["Rev"] if include_rev else [])
+            start, end = dates if dates else (None, None)
+            summary = self.get_period_summary(start, end, granularity, categories, types, 
+                                              group_category = group_category)
+        else:
+            summary = self.get_records(dates, categories, 
+                                       group_date = group_date, 
+                                       group_category = group_category, 
+                                       include_exp = include_exp, 
+                                       include_rev = include_rev)
+        
+        if group_date and group_category:
+            by_category = summary.groupby("Category", observed = True)["Amount"].sum().reset_index()
         elif (not group_date) and group_category:
-            records = temp.groupby(["Category", "Type"])["Amount"].sum().reset_index()
+            by_category = summary
         else:
-            records = temp.sort_values(by = "Date", ascending = True).reset_index(drop = True)
+            by_category = self.get_records(dates, categories, 
+                                           group_date = False, 
+                                           group_category = True, 
+                                           include_exp = include_exp, 
+                                           include_rev = include_rev)
         
-        types = []
-        if include_exp:
-            types.append("Exp")
-        if include_rev:
-            types.append("Rev")
+        return summary, by_category
+
+    def get_period_summary(self, start: dt.date, end: dt.date, granularity = "month", 
+                           categories: List[str] = None, types: List[str] = ["Exp"], 
+                           group_category = False, crosstab = False) -> pd.DataFrame:
+        """
+        Summing the records by period, in SQLite from the daily rollup, e.g. for summarizing several years by month.
+        ## Parameters:
+        - `start`, `end`: `dt.date`. The date range (both included); `None` for no bound.
+        - `granularity`: `str`, default `"month"`. One of `"day"`, `"week"`, `"month"`, `"quarter"` and `"year"` (see `PERIOD_BUCKETS`).
+        - `categories`: `List[str]`, default `None`. `None` means all categories.
+        - `types`: `List[str]`, default `["Exp"]`. The types of records to sum. When both are included, the revenues are 
+                   subtracted from the expenditures.
+        - `group_category`: `bool`, default `False`. Whether summing each category separately, in one row per period and category.
+        - `crosstab`: `bool`, default `False`. Whether summing each category separately, in one column per category (and a 
+                      Total column). With `categories = None`, the columns are all the categories.
+        Returns the columns Period, then Category (a `pd.Categorical`, as in `get_records`) and Amount, or the categories and 
+        Total, or Amount; ordered by period. Periods without records are left out.
+        """
 
-        records = records[records["Type"].isin(types)].reset_index(drop = True)
-        if include_exp and include_rev:
-            records["Type"] = records["Type"].map({"Exp": 1, "Rev": -1})
-            records["Amount"] = records["Amount"] * records["Type"]
+        if crosstab and categories is None:
+            categories = self.get_categories()
 
-        records.drop("Type", axis = 1, inplace = True)
+        query, params, column_names = build_period_query(start, end, granularity, categories, types, 
+                                                         group_category, crosstab)
+
+        ### The sums are in cents, like the rollup.
+        def fetch():
+            summary = pd.DataFrame(self._fetch_rows(query, params), columns = column_names)
+            amounts = [column for column in column_names if column not in ["Period", "Category"]]
+            summary[amounts] = summary[amounts].astype(float) / 100
+            if "Category" in column_names:
+                summary["Category"] = category_names(summary["Category"].to_numpy(dtype = np.int64), self._categories())
+
+            return summary
+
+        return self._fetch_frame(query, params, column_names, fetch = fetch)
+
+    def get_records_page(self, dates: List[dt.date] = [], categories: List[str] = None, 
+                         include_exp = True, include_rev = True, 
+                         sort_by = "Date", ascending = True, 
+                         after = None, limit = 500) -> pd.DataFrame:
+        """
+        Retrieving one page of records (with their ids) with keyset pagination, for displaying a long ledger lazily.
+        ## Parameters:
+        - `dates`, `categories`, `include_exp`, `include_rev`: the same filters as `get_records`. `categories = None` means all categories.
+        - `sort_by`: `str`, default `"Date"`. The column to sort by; ties are sorted by id. The categories are sorted by id, 
+                     i.e. in the order they were added (as in `get_categories`) rather than by name, so that the pages are 
+                     read from the index on Category.
+        - `ascending`: `bool`, default `True`. The sorting order.
+        - `after`: `tuple`, default `None`. The (`sort_by` value, id) of the last record of the previous page; `None` for the first page.
+        - `limit`: `int`, default `500`. The maximum number of records in the page.
+        """
+
+        column_names = ["id", "Date", "Category", "Amount"]
+        rows = self._read_ledger(dates, categories = categories, 
+                                 include_id = True, 
+                                 include_exp = include_exp, include_rev = include_rev, 
+                                 sort_by = sort_by, ascending = ascending, 
+                                 after = after, limit = limit)
+
+        records = decode_rows(rows, column_names)
+        records["Category"] = category_names(records["Category"].to_numpy(), self._categories())
 
         return records
 
-    def get_all_records(self, include_id = False, include_exp = True, include_rev = True):
-        query = """
-        SELECT id, Date, Category, Amount, Type
-        FROM expenditure
+    def _read_ledger(self, dates: List[dt.date] = [], **kwargs) -> List[tuple]:
+        """
+        Running the query of `build_records_query(dates, **kwargs)` on the ledger records, one batch of tables at a time (see 
+        `_ledger_tables`). The records of several batches are merged in the order of the query.
+        """
+        connection = self._reader()
+        batches = []
+        for tables in self._ledger_tables(connection, dates):
+            query, params, column_names = build_records_query(dates, tables = tables, **kwargs)
+            batches.append(self._fetch_rows(query, params))
+
+        if len(batches) == 1:
+            return batches[0]
+        
+        keys = [column_names.index(kwargs.get("sort_by", "Date"))] + ([column_names.index("id")] if "id" in column_names else [])
+        rows = heapq.merge(*batches, key = lambda row: [row[key] for key in keys], reverse = not kwargs.get("ascending", True))
+
+        return list(itertools.islice(rows, kwargs.get("limit")))
+
+    def _fetch_rows(self, query: str, params: list) -> List[tuple]:
         """
+        Running a query on the reader of the calling thread. With the diagnostics on, the query is timed with its row count.
+        """
+        start = time.perf_counter()
+        rows = self._reader().execute(query, params).fetchall()
 
-        self._cursor.execute(query)
-        column_names = [desc[0] for desc in self._cursor.description]
+        if DIAGNOSTICS.enabled:
+            DIAGNOSTICS.record_statement(query, time.perf_counter() - start, len(rows))
 
-        records = pd.DataFrame(self._cursor.fetchall(), columns = column_names)
-        records = records.sort_values(by = "Date", ascending = True).reset_index(drop = True)
+        return rows
 
-        if not include_id:
-            records = records.drop("id", axis = 1)
+    def _fetch_frame(self, query: str, params: list, column_names: List[str], fetch = None) -> pd.DataFrame:
+        """
+        Running a query through the result cache. The query and its parameters are the cache key, as they are 
+        already normalized by `build_records_query`. `fetch`, if specified, returns the result (as a DataFrame) in its 
+        stead, e.g. from the year shards.
+        Callers always receive their own copy of the result, so that editing it does not corrupt the cache.
+        """
+        key = (query, tuple(params))
+        generation = self._cache_generation()
         
-        types = []
-        if include_exp:
-            types.append("Exp")
-        if include_rev:
-            types.append("Rev")
+        with self._cache_lock:
+            records = self._cache.get(key, generation)
 
-        records = records[records["Type"].isin(types)].reset_index(drop = True)
-        if include_exp and include_rev:
-            records["Type"] = records["Type"].map({"Exp": 1, "Rev": -1})
-            records["Amount"] = records["Amount"] * records["Type"]
+        if records is None:
+            if fetch is None:
+                records = pd.DataFrame(self._fetch_rows(query, params), columns = column_names)
+            else:
+                records = fetch()
+            with self._cache_lock:
+                self._cache.put(key, generation, records)
 
-        records.drop("Type", axis = 1, inplace = True)
+        return records.copy()
 
-        return records
+    def _cache_generation(self) -> int:
+        """
+        The write generation of the database, as seen by the calling thread. `PRAGMA data_version` of the thread's reader 
+        changes with every commit of another connection, including the writer of this handler, so a change also starts a 
+        new generation (at the cost of one extra miss per thread after our own writes).
+        """
+        data_version = self._reader().execute("PRAGMA data_version;").fetchone()[0]
+
+        with self._cache_lock:
+            if getattr(self._local, "data_version", None) != data_version:
+                self._local.data_version = data_version
+                self._generation += 1
+            
+            return self._generation
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return self._cache.stats()
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def db_name(self) -> str:
+        return self._db_name
+
+    def count_records(self, dates: List[dt.date] = [], categories: List[str] = None, 
+                      include_exp = True, include_rev = True) -> int:
+        ### The sum of the counts of each batch of tables (see `_ledger_tables`)
+        count = 0
+        for tables in self._ledger_tables(self._reader(), dates):
+            query, params, _ = build_records_query(dates, categories, 
+                                                   include_exp = include_exp, include_rev = include_rev, 
+                                                   tables = tables, count = True)
+            count += self._fetch_rows(query, params)[0][0] or 0
+
+        return count
+
+    def export_records(self, file_path: str, dates: List[dt.date] = [], categories: List[str] = None, 
+                       include_exp = True, include_rev = True, 
+                       chunk_size = 50_000, progress = None) -> dict:
+        """
+        Exporting the records (with their ids) selected by the same filters as `get_records` to a CSV, newline-delimited JSON 
+        or XLSX file, with the columns id, Date, Category, Amount and Type, which `import_file` reads back. The rows are 
+        streamed from the database cursor to the file chunk by chunk, so memory use does not depend on the number of 
+        exported records.
+        ## Parameters:
+        - `file_path`: `str`. The file to write, whose extension decides the format (see `RecordWriter`).
+        - `dates`, `categories`, `include_exp`, `include_rev`: the filters of `get_records`. `categories = None` means all categories.
+        - `chunk_size`: `int`, default `50_000`. The number of rows fetched and written at a time.
+        - `progress`: callable, default `None`. Called with the number of exported rows after each chunk. If it returns `False`, 
+                      the export is cancelled and the incomplete file is removed.
+        Returns the number of exported rows, and whether the export was cancelled.
+        """
+
+        connection = self._reader()
+        stats = {"exported": 0, "cancelled": False}
+        all_categories = self._categories()
+
+        ### The amounts are written unsigned with their Type, as `import_file` reads them back.
+        column_names = ["id", "Date", "Category", "Amount", "Type"]
+
+        with RecordWriter(file_path, column_names) as writer:
+            ### One query per batch of tables (see `_ledger_tables`), in date order. Each of them has a cursor of its own on 
+            ### the reader of this thread, and reads one consistent snapshot of the database, while records keep being written.
+            for tables in self._ledger_tables(connection, dates):
+                query, params, _ = build_records_query(dates, categories, 
+                                                       include_id = True, include_type = True, 
+                                                       include_exp = include_exp, include_rev = include_rev, 
+                                                       tables = tables)
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+
+                try:
+                    while rows := cursor.fetchmany(chunk_size):
+                        records = decode_rows(rows, ["id", "Date", "Category", "Type", "Amount"])
+                        records["Category"] = category_names(records["Category"].to_numpy(), all_categories)
+                        writer.write(list(zip(*[records[column].tolist() for column in column_names])))
+                        stats["exported"] += len(rows)
+
+                        if progress is not None and progress(stats["exported"]) is False:
+                            stats["cancelled"] = True
+                            break
+                finally:
+                    cursor.close()
+                
+                if stats["cancelled"]:
+                    break
+
+        if stats["cancelled"]:
+            os.remove(file_path)
+
+        return stats
+
+    def import_file(self, file_path: str, chunk_size = 50_000, progress = None, rejected_path = None) -> dict:
+        """
+        Importing records from a CSV, JSON or XLSX file, chunk by chunk, so that large files are never held in memory at once.
+        Each chunk is validated (see `validate_records`), given new ids and inserted in one transaction.
+        ## Parameters:
+        - `file_path`: `str`. The file to import, with the columns Date, Category, Amount and Type. Without a Type column, the 
+                       amounts must be signed (negative revenues), which is only assumed if the file has negative amounts. 
+                       Other columns (e.g. id) are ignored.
+        - `chunk_size`: `int`, default `50_000`. The number of rows to read, validate and insert at a time.
+        - `progress`: callable, default `None`. Called with the statistics of the import after each chunk. If it returns `False`, 
+                      the import stops after that chunk.
+        - `rejected_path`: `str`, default `None`. If specified, the rejected rows are written to this CSV file, with the reason.
+        Returns the numbers of rows read, imported and rejected.
+        """
+
+        stats = {"read": 0, "imported": 0, "rejected": 0}
+        categories = self._categories()
+        signed = None
+
+        for chunk in read_file_chunks(file_path, chunk_size):
+            if signed is None and "Type" not in chunk.columns and "Amount" in chunk.columns:
+                ### Whether the amounts are signed is decided for the whole file, since a chunk may have only expenditures.
+                signed = any((pd.to_numeric(part["Amount"], errors = "coerce") < 0).any() 
+                             for part in read_file_chunks(file_path, chunk_size))
+            
+            records, rejected = validate_records(chunk, [name for _, name in categories], first_row = stats["read"], 
+                                                 signed = signed)
+            stats["read"] += len(chunk)
+
+            if len(records):
+                ### One transaction per chunk (see `_insert_rows`): the chunk is either inserted entirely or not at all. 
+                ### The write lock is released between chunks, so that records entered meanwhile are not held up by the 
+                ### whole import.
+                with self._write_lock:
+                    ids = self.allocate_ids(records["Date"].tolist())
+                    records = encode_records(records, categories)
+                    self._insert_rows(list(zip(ids, records["Date"].tolist(), records["Category"].tolist(), 
+                                               records["Amount"].tolist(), records["Type"].tolist())))
+                
+                self._written()
+                stats["imported"] += len(records)
+
+            if len(rejected):
+                if rejected_path is not None:
+                    rejected.to_csv(rejected_path, mode = "a" if stats["rejected"] else "w", 
+                                    header = not stats["rejected"], index = False)
+                stats["rejected"] += len(rejected)
+
+            if progress is not None and progress(dict(stats)) is False:
+                break
+
+        return stats
 
     def update_record(self, id_: int, date: dt.date, category: str, amount: float):
+        self.update_records([{"id": id_, "Date": date, "Category": category, "Amount": amount}])
+
+    def update_records(self, changes: List[dict], categories: List[str] = None) -> int:
+        """
+        Applying edited records in one transaction: either every change is applied, or none of them.
+        ## Parameters:
+        - `changes`: `List[dict]`. The edited records, with the keys id, Date, Category and Amount (other keys, e.g. Type, are 
+                     ignored). Each of them is checked by `validate_change` before anything is written.
+        - `categories`: `List[str]`, default `None`. The valid categories; `None` means all categories.
+        Returns the number of updated records. If a record doesn't exist (anymore), nothing is updated and a `ValueError` is raised.
+        """
+        categories = self.get_categories() if categories is None else categories
+        rows = [validate_change(change, categories) for change in changes]
+
+        ### The records refer to their category by id.
+        names = sorted({row[1] for row in rows})
+        category_ids = dict(zip(names, self._category_ids(names)))
+        rows = [(date, category_ids[category], amount, record_id) for date, category, amount, record_id in rows]
+        if self._shards is not None:
+            return self._update_shards(rows)
+        
         query = """
             UPDATE expenditure
             SET Date = ?, Category = ?, Amount = ?
             WHERE id = ?;
         """
 
-        self._cursor.execute(query, (date, category, amount, id_))
-        self._connection.commit()
+        with self._write_lock:
+            try:
+                updated = self._connection.executemany(query, rows).rowcount
+                if updated != len(rows):
+                    raise ValueError(f"Only {updated} of the {len(rows)} edited records exist, no changes were applied.")
+            except (ValueError, sql.Error):
+                self._connection.rollback()
+                raise
+            
+            self._connection.commit()
+        
+        self._written()
+
+        return updated
     
-    def delete_records(self, *record_ids):
-        self._cursor.executemany(
-            "DELETE FROM expenditure WHERE id = ?;",
-            [(record_id, ) for record_id in record_ids]
-        )
-   
-        self._connection.commit()
+    def _update_shards(self, rows: List[tuple]) -> int:
+        """
+        Applying validated changes (see `validate_change`) to a partitioned ledger in one transaction. A record whose year 
+        changes is moved to the shard of its new year.
+        """
+        with self._write_lock:
+            located = self._locate_records([row[3] for row in rows])
+            shard_of = {record_id: year for year, record_ids in located.items() for record_id in record_ids}
+            if len(shard_of) != len({row[3] for row in rows}):
+                raise ValueError(f"Only {len(shard_of)} of the {len(rows)} edited records exist, no changes were applied.")
+
+            years = sorted(set(shard_of.values()) | {day_year(row[0]) for row in rows})
+            if len(years) > MAX_ATTACHED_SHARDS:
+                raise ValueError(f"The edited records span {len(years)} years, at most {MAX_ATTACHED_SHARDS} can be changed at once.")
+            
+            self._prepare_shards(years)
+            try:
+                for date, category, amount, record_id in rows:
+                    old, new = self._shards.table(shard_of[record_id]), self._shards.table(day_year(date))
+                    if old == new:
+                        self._connection.execute(f"UPDATE {old} SET Date = ?, Category = ?, Amount = ? WHERE id = ?;", 
+                                                 (date, category, amount, record_id))
+                    else:
+                        self._connection.execute(f"""
+                            INSERT INTO {new} (id, Date, Category, Amount, Type)
+                            SELECT id, ?, ?, ?, Type FROM {old} WHERE id = ?;
+                        """, (date, category, amount, record_id))
+                        self._connection.execute(f"DELETE FROM {old} WHERE id = ?;", (record_id, ))
+                        shard_of[record_id] = day_year(date)
+                        if id_year(record_id) != day_year(date):
+                            self._advance_id_sequence([record_id])
+            except sql.Error:
+                self._connection.rollback()
+                raise
+            
+            self._connection.commit()
+        
+        self._written()
+
+        return len(rows)
+    
+    def delete_records(self, *record_ids) -> int:
+        """
+        Deleting the records with the given ids in one statement: the ids are loaded into a temporary table, and deleted 
+        from the ledger with a single `DELETE`, all in one transaction (in a partitioned ledger, one `DELETE` per shard, and 
+        one transaction per batch of shards).
+        Returns the number of deleted records.
+        """
+        record_ids = [int(record_id) for record_id in record_ids]
+
+        with self._write_lock:
+            if self._shards is None:
+                batches = [["expenditure"]]
+            else:
+                batches = self._shards.batches(sorted(self._locate_records(record_ids)))
+            
+            deleted = 0
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS deleted_ids (id INTEGER PRIMARY KEY);")
+            for tables in batches:
+                ### Shards can only be attached outside of transactions, so they are attached before each batch.
+                if self._shards is not None:
+                    self._prepare_shards(tables)
+                    tables = [self._shards.table(year) for year in tables]
+                
+                try:
+                    self._connection.executemany("INSERT OR IGNORE INTO temp.deleted_ids (id) VALUES (?);", 
+                                                 [(record_id, ) for record_id in record_ids])
+                    for table in tables:
+                        deleted += self._connection.execute(
+                            f"DELETE FROM {table} WHERE id IN (SELECT id FROM temp.deleted_ids);"
+                        ).rowcount
+                    self._connection.execute("DELETE FROM temp.deleted_ids;")
+                except sql.Error:
+                    self._connection.rollback()
+                    raise
+        
+                self._connection.commit()
+        
+        self._written()
+
+        return deleted
 
     def close_connection(self):
+        """
+        Saving the temporary records and closing the writer and every reader. Background queries must be finished first.
+        """
         self._add_records()
-        self._connection.close()
 
+        with self._write_lock:
+            self._connection.execute("PRAGMA optimize;")
+            self._connection.close()
+        
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+        
+        if self._shards is not None:
+            self._shards.forget()
+        self._snapshots.forget()
+
+## The methods timed by the diagnostics (see `diagnostics.py`)
+DIAGNOSTICS.register(DataHandler, [
+    "get_records", "get_all_records", "get_summary", "get_records_page", "count_records", 
+    "add_temp_rec", "flush_staging", "allocate_ids", "_add_records", "add_records", 
+    "update_records", "delete_records", "import_file", "export_records", "snapshot_years"
+])
+
+
+class QueryCache:
+    """
+    A bounded LRU cache for query results. Each entry remembers the write generation of the database it was 
+    computed at, and entries from an older generation are treated as misses and dropped.
+    """
+    def __init__(self, maxsize = 32):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, generation):
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] != generation:
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def put(self, key, generation, value):
+        self._entries[key] = (generation, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last = False)
+            self._evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "size": len(self._entries),
+            "maxsize": self._maxsize
+        }
+
+class StagingBuffer:
+    """
+    An append-only buffer of staged records, kept as one list per column, so that appending a record costs O(1). 
+    The DataFrame of the records is only built when it's asked for, with the names of their category ids, and kept until 
+    the next append (or a change of the categories). The buffer also remembers how many of its records have been flushed 
+    to the staging table.
+    """
+    COLUMN_NAMES = ["id", "Date", "Category", "Amount", "Type"]
+
+    def __init__(self, rows = ()):
+        self._columns = [[] for _ in self.COLUMN_NAMES]
+        self._frame = None
+        self._frame_categories = None
+
+        for row in rows:
+            self.append(row)
+        
+        ### The initial records come from the staging table.
+        self._flushed = len(self)
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def append(self, row: tuple):
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        
+        self._frame = None
+
+    def frame(self, categories: List[tuple]) -> pd.DataFrame:
+        """
+        The staged records, with the names of their categories from `categories` (the (id, Name) pairs of the `categories` 
+        table).
+        """
+        if self._frame is None or self._frame_categories != categories:
+            names = dict(categories)
+            columns = dict(zip(self.COLUMN_NAMES, self._columns))
+            columns["Category"] = [names[category_id] for category_id in columns["Category"]]
+            self._frame = pd.DataFrame(columns, columns = self.COLUMN_NAMES)
+            self._frame_categories = categories
+        
+        return self._frame
+
+    def pending(self) -> List[tuple]:
+        return list(zip(*(column[self._flushed:] for column in self._columns)))
+
+    def mark_flushed(self, count: int):
+        self._flushed += count
+
+    def clear(self):
+        for column in self._columns:
+            column.clear()
+        
+        self._frame = None
+        self._flushed = 0
+
+class YearShards:
+    """
+    The year shards of a partitioned ledger: the records of each year are stored in a SQLite file of their own next to the 
+    main database (e.g. `expenditrue.2024.db`), so that the files of past years stop growing, and can be closed (see 
+    `DataHandler.close_year`), compacted and backed up once. The main database keeps the rollup, the id sequence, the 
+    staging table and the list of shards, so grouped queries never open the shards.
+    The shards are ATTACHed to each connection on demand, at most `max_attached` at a time: the least recently used ones are 
+    detached first. On the writer, they also get the TEMP triggers keeping the rollup and the snapshots in step with them.
+    """
+    def __init__(self, db_name: str, max_attached = MAX_ATTACHED_SHARDS):
+        self._root, self._extension = os.path.splitext(db_name)
+        self._max_attached = max_attached
+        self._attached = {}
+
+    def path(self, year: int) -> str:
+        return f"{self._root}.{year}{self._extension or '.db'}"
+
+    def schema(self, year: int) -> str:
+        return f"shard_{year}"
+
+    def table(self, year: int) -> str:
+        return f"{self.schema(year)}.expenditure"
+
+    def batches(self, years: List[int]) -> List[List[int]]:
+        """
+        Splitting `years` into batches that can be attached at the same time.
+        """
+        return [years[start:start + self._max_attached] for start in range(0, len(years), self._max_attached)]
+
+    def attach(self, connection: sql.Connection, years: List[int], triggers = False):
+        """
+        Attaching the shards of `years` to `connection` if they are not yet, with the rollup triggers if `triggers`. 
+        Must be called outside of transactions, as SQLite cannot attach or detach databases in them.
+        """
+        if len(years) > self._max_attached:
+            raise ValueError(f"At most {self._max_attached} year shards can be attached at a time, {len(years)} instead.")
+        
+        attached = self._attached.setdefault(connection, OrderedDict())
+
+        for year in years:
+            if year in attached:
+                attached.move_to_end(year)
+                continue
+
+            while len(attached) >= self._max_attached:
+                self._detach(connection, next(old for old in attached if old not in years))
+
+            schema = self.schema(year)
+            connection.execute(f"ATTACH DATABASE ? AS {schema};", (self.path(year), ))
+            for pragma, value in CONNECTION_PRAGMAS.items():
+                connection.execute(f"PRAGMA {schema}.{pragma} = {value};")
+            
+            if triggers:
+                connection.executescript(ROLLUP_TRIGGERS.format(temp = "TEMP ", name = schema, table = self.table(year)))
+                connection.executescript(snapshot_triggers("TEMP ", schema, self.table(year)))
+            
+            attached[year] = triggers
+
+    def _detach(self, connection: sql.Connection, year: int):
+        schema = self.schema(year)
+
+        ### TEMP triggers outlive the database they are on, so they are dropped first.
+        if self._attached[connection].pop(year):
+            for event in ["insert", "delete", "update"]:
+                connection.execute(f"DROP TRIGGER IF EXISTS temp.{schema}_{event};")
+                connection.execute(f"DROP TRIGGER IF EXISTS temp.{schema}_snapshot_{event};")
+        
+        connection.execute(f"DETACH DATABASE {schema};")
+
+    def forget(self):
+        """
+        Forgetting the attached shards, when the connections are closed.
+        """
+        self._attached.clear()
 
 def safe_concat(base: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
     """
@@ -220,12 +1720,496 @@ def safe_concat(base: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
         updated = pd.concat([base, new], ignore_index = True)
         return updated
 
-def generate_id(date: dt.date) -> int:
+def build_records_query(dates: List[dt.date] = [], categories: List[str] = None, 
+                        group_date = False, group_category = False, 
+                        include_id = False, include_type = False, 
+                        include_exp = True, include_rev = True, 
+                        sort_by = "Date", ascending = True, after = None, limit = None, 
+                        tables: List[str] = ["expenditure"], count = False, group_type = False):
     """
-    Generating unique id for records. 
-    Note that if the number of daily records is large, there might be key collisions.
+    Translating the filters of `DataHandler.get_records` into a parameterized SQL query, so that filtering, 
+    grouping and summing are done by SQLite instead of pandas. Grouped queries are answered from the `daily_totals` rollup.
+    `categories = None` means no filtering on Category. The categories are filtered, sorted and returned by id.
+    Ungrouped records are ordered by `sort_by` and then id. `after` (the sort value and the id of a record) and `limit` 
+    select a page of them with keyset pagination. They are read from `tables` (e.g. the year shards of a partitioned ledger) 
+    with a `UNION ALL`, or counted with `count`. `include_type` also returns their Type, with the Amount unsigned. 
+    Grouped records are summed per type, and `group_type` also returns their Type.
+    Returns the query, its parameters and the names of the output columns.
     """
-    date_id = dt.date.strftime(date, "%Y%m%d")
-    random_id = str(random.random()).split(".")[1][:4]
 
-    return int(date_id + random_id)
\ No newline at end of file
+    if sort_by not in ["id", "Date", "Category", "Amount"]:
+        raise ValueError(f"sort_by argument must be one of 'id', 'Date', 'Category' and 'Amount', {sort_by} instead.")
+
+    conditions = []
+    params = []
+
+    if dates:
+        conditions.append("Date BETWEEN ? AND ?")
+        params.extend([to_day(dates[0]), to_day(dates[1])])
+
+    if categories is not None:
+        categories = sorted(set(categories))
+        conditions.append(f"Category IN (SELECT id FROM categories WHERE Name IN ({placeholders(len(categories))}))")
+        params.extend(categories)
+
+    types = []
+    if include_exp:
+        types.append("Exp")
+    if include_rev:
+        types.append("Rev")
+
+    conditions.append(f"Type IN ({placeholders(len(types))})")
+    params.extend(types)
+
+    ### Revenues are negative when both types are included, unless their Type is returned: the ledger tables store the 
+    ### signed amounts (see `INTEGER_LEDGER`).
+    if include_exp and include_rev and not include_type:
+        amount = "CASE WHEN Type = 'Rev' THEN -Amount ELSE Amount END" if group_date or group_category else "Signed"
+    else:
+        amount = "Amount"
+
+    group_columns = []
+    if group_date:
+        group_columns.append("Date")
+    if group_category:
+        group_columns.append("Category")
+
+    if group_columns:
+        ### Grouped queries read the daily rollup, which has the same columns as the ledger.
+        ### Records of different types are summed separately, as they were grouped by Type.
+        table = "daily_totals"
+        column_names = group_columns + (["Type"] if group_type else []) + ["Amount"]
+        select = ", ".join(column_names[:-1] + [f"SUM({amount}) AS Amount"])
+        group_by = f"GROUP BY {', '.join(group_columns)}, Type"
+        order_by = f"ORDER BY {', '.join(group_columns)}, Type"
+    else:
+        column_names = (["id"] if include_id else []) + ["Date", "Category"] + (["Type"] if include_type else []) + ["Amount"]
+        select = ", ".join(column_names[:-1] + [f"{amount} AS Amount"])
+        group_by = ""
+        table = "expenditure"
+
+        sort_column = amount if sort_by == "Amount" else sort_by
+        direction, comparison = ("ASC", ">") if ascending else ("DESC", "<")
+
+        if after is not None:
+            ### NumPy scalars would be bound as blobs, so they are converted to Python scalars first, and the dates and 
+            ### amounts (as returned by `get_records_page`) to their stored values.
+            sort_value, last_id = [value.item() if hasattr(value, "item") else value for value in after]
+            value = "?"
+            if sort_by == "Date":
+                sort_value = to_day(sort_value)
+            elif sort_by == "Amount":
+                sort_value = to_cents(sort_value)
+            elif sort_by == "Category":
+                value = "(SELECT id FROM categories WHERE Name = ?)"
+
+            ### The first condition lets SQLite start a range scan on the sort column.
+            conditions.append(f"{sort_column} {comparison}= {value} AND ({sort_column} {comparison} {value} OR id {comparison} ?)")
+            params.extend([sort_value, sort_value, last_id])
+
+        order_by = f"ORDER BY {sort_column} {direction}, id {direction}"
+
+    where = " AND ".join(conditions)
+
+    if count and not group_columns:
+        ### The sum of the counts of each table, without sorting the records
+        arms = [f"SELECT COUNT(*) AS Count FROM {table} WHERE {where}" for table in tables]
+        return f"SELECT SUM(Count) FROM ({' UNION ALL '.join(arms)});", params * len(tables), ["Count"]
+    
+    if not group_columns and len(tables) > 1:
+        ### A compound query, so that SQLite merges the records of each table, sorted on their own (and stops early with 
+        ### `limit`). The ids are always selected for sorting, and left out afterwards if not asked for.
+        sort_name = "Amount" if sort_by == "Amount" else sort_by
+        arm_select = select if include_id else f"id, {select}"
+        arms = [f"SELECT {arm_select} FROM {table} WHERE {where}" for table in tables]
+        query = f"""
+            SELECT {", ".join(column_names)} FROM (
+                {" UNION ALL ".join(arms)}
+                ORDER BY {sort_name} {direction}, id {direction}
+                {"LIMIT ?" if limit is not None else ""}
+            )
+        """
+        
+        return query, params * len(tables) + ([limit] if limit is not None else []), column_names
+    
+    if not group_columns:
+        table = tables[0]
+
+    query = f"""
+        SELECT {select}
+        FROM {table}
+        WHERE {where}
+        {group_by}
+        {order_by}
+    """
+
+    if limit is not None:
+        query += "LIMIT ?"
+        params.append(limit)
+
+    return query, params, column_names
+
+def build_period_query(start: dt.date, end: dt.date, granularity = "month", 
+                       categories: List[str] = None, types: List[str] = ["Exp"], 
+                       group_category = False, crosstab = False):
+    """
+    Translating the arguments of `DataHandler.get_period_summary` into a parameterized SQL query on the `daily_totals` 
+    rollup, bucketing the dates with `PERIOD_BUCKETS`. The cross-tab is computed with one conditional sum per category, 
+    so it needs the names of its `categories` (e.g. all of `DataHandler.get_categories`).
+    Returns the query, its parameters and the names of the output columns.
+    """
+
+    if granularity not in PERIOD_BUCKETS:
+        raise ValueError(f"granularity argument must be one of {', '.join(map(repr, PERIOD_BUCKETS))}, {granularity} instead.")
+    
+    if crosstab and categories is None:
+        raise ValueError("The cross-tab needs the list of its categories, e.g. DataHandler.get_categories().")
+    
+    types = sorted(set(types))
+    if not types or not set(types) <= {"Exp", "Rev"}:
+        raise ValueError(f"types argument must include 'Exp' and/or 'Rev', {types} instead.")
+
+    conditions = []
+    params = []
+
+    if start is not None:
+        conditions.append("Date >= ?")
+        params.append(to_day(start))
+    if end is not None:
+        conditions.append("Date <= ?")
+        params.append(to_day(end))
+
+    if categories is not None:
+        categories = sorted(set(categories))
+        conditions.append(f"Category IN (SELECT id FROM categories WHERE Name IN ({placeholders(len(categories))}))")
+        params.extend(categories)
+
+    conditions.append(f"Type IN ({placeholders(len(types))})")
+    params.extend(types)
+
+    ### Revenues are negative when both types are included.
+    amount = "CASE WHEN Type = 'Rev' THEN -Amount ELSE Amount END" if len(types) == 2 else "Amount"
+
+    if crosstab:
+        select = ", ".join([f"SUM(CASE WHEN Category = (SELECT id FROM categories WHERE Name = ?) THEN {amount} ELSE 0 END)" 
+                            for _ in categories] + [f"SUM({amount})"])
+        params = list(categories) + params
+        column_names = ["Period"] + list(categories) + ["Total"]
+        group_columns = ["Period"]
+
+    elif group_category:
+        select = f"Category, SUM({amount})"
+        column_names = ["Period", "Category", "Amount"]
+        group_columns = ["Period", "Category"]
+    
+    else:
+        select = f"SUM({amount})"
+        column_names = ["Period", "Amount"]
+        group_columns = ["Period"]
+
+    query = f"""
+        SELECT {PERIOD_BUCKETS[granularity]} AS Period, {select}
+        FROM daily_totals
+        WHERE {" AND ".join(conditions)}
+        GROUP BY {", ".join(group_columns)}
+        ORDER BY {", ".join(group_columns)}
+    """
+
+    return query, params, column_names
+
+class RecordWriter:
+    """
+    Writing rows incrementally to a CSV, newline-delimited JSON (.json or .jsonl) or XLSX file. XLSX files are written with 
+    openpyxl's write-only mode, and rows beyond the row limit of a worksheet continue on a new worksheet.
+    """
+    XLSX_MAX_ROWS = 1_048_576
+
+    def __init__(self, file_path: str, column_names: List[str]):
+        self._file_path = file_path
+        self._column_names = column_names
+
+        if file_path.endswith(".csv"):
+            self._format = "csv"
+            self._file = open(file_path, "w", newline = "")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(column_names)
+
+        elif file_path.endswith((".json", ".jsonl", ".ndjson")):
+            self._format = "json"
+            self._file = open(file_path, "w")
+
+        elif file_path.endswith(".xlsx"):
+            from openpyxl import Workbook
+
+            self._format = "xlsx"
+            self._workbook = Workbook(write_only = True)
+            self._new_sheet()
+
+        else:
+            raise ValueError(f"Unsupported file type: {file_path}. Only .csv, .json (.jsonl) and .xlsx files can be saved.")
+
+    def _new_sheet(self):
+        self._sheet = self._workbook.create_sheet()
+        self._sheet.append(self._column_names)
+        self._sheet_rows = 1
+
+    def write(self, rows: List[tuple]):
+        if self._format == "csv":
+            self._writer.writerows(rows)
+
+        elif self._format == "json":
+            self._file.writelines(json.dumps(dict(zip(self._column_names, row))) + "\n" for row in rows)
+
+        else:
+            for row in rows:
+                if self._sheet_rows == self.XLSX_MAX_ROWS:
+                    self._new_sheet()
+                self._sheet.append(row)
+                self._sheet_rows += 1
+
+    def close(self):
+        if self._format == "xlsx":
+            self._workbook.save(self._file_path)
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_file_chunks(file_path: str, chunk_size = 50_000):
+    """
+    Reading a CSV, JSON or XLSX file in data frames of at most `chunk_size` rows.
+    Newline-delimited JSON is streamed, while a JSON array of records has to be loaded at once before being chunked.
+    """
+
+    if file_path.endswith(".csv"):
+        with pd.read_csv(file_path, chunksize = chunk_size, dtype = str) as reader:
+            yield from reader
+
+    elif file_path.endswith((".json", ".jsonl", ".ndjson")):
+        with open(file_path) as file:
+            is_array = file.read(1024).lstrip().startswith("[")
+
+        if is_array:
+            records = pd.read_json(file_path, orient = "records", dtype = False, convert_dates = False)
+            for start in range(0, len(records), chunk_size):
+                yield records.iloc[start:start + chunk_size]
+        else:
+            with pd.read_json(file_path, lines = True, chunksize = chunk_size, dtype = False, convert_dates = False) as reader:
+                yield from reader
+
+    elif file_path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only = True)
+        try:
+            rows = workbook.active.iter_rows(values_only = True)
+            header = next(rows, None)
+            batch = []
+
+            for row in rows:
+                batch.append(row)
+                if len(batch) == chunk_size:
+                    yield pd.DataFrame(batch, columns = header)
+                    batch = []
+
+            if batch:
+                yield pd.DataFrame(batch, columns = header)
+        finally:
+            workbook.close()
+
+    else:
+        raise ValueError(f"Unsupported file type: {file_path}. Only .csv, .json (.jsonl) and .xlsx files can be imported.")
+
+def validate_records(chunk: pd.DataFrame, categories: List[str] = CATEGORIES, first_row = 0, signed = None):
+    """
+    Validating records to import: Date must be a date, Category must be in `categories`, Amount must be a non-negative number 
+    and Type must be either 'Exp' or 'Rev'. Without a Type column, the type is only told by the sign of the amounts if they 
+    are `signed` (negative revenues, as in the files saved by earlier versions of the dashboard), which by default is 
+    whether `chunk` has negative amounts. Otherwise, every row is rejected for its missing Type.
+    Returns the valid records (with the columns Date, Category, Amount and Type), and the rejected rows with their row number 
+    in the file (counting from `first_row`) and the reason.
+    """
+
+    missing = [column for column in ["Date", "Category", "Amount"] if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"The file must have the columns Date, Category and Amount, {missing} missing.")
+    
+    dates = pd.to_datetime(chunk["Date"], format = "ISO8601", errors = "coerce")
+    amounts = pd.to_numeric(chunk["Amount"], errors = "coerce")
+
+    if "Type" in chunk.columns:
+        types = chunk["Type"].astype(str).str.strip()
+    elif (amounts < 0).any() if signed is None else signed:
+        types = pd.Series(np.where(amounts < 0, "Rev", "Exp"), index = chunk.index)
+        amounts = amounts.abs()
+    else:
+        types = pd.Series(None, index = chunk.index, dtype = object)
+
+    reasons = pd.Series("", index = chunk.index)
+    reasons[~types.isin(["Exp", "Rev"])] = "invalid Type" if "Type" in chunk.columns else "missing Type"
+
+    reasons[amounts.isna() | (amounts < 0)] = "invalid Amount"
+    reasons[~chunk["Category"].isin(categories)] = "unknown Category"
+    reasons[dates.isna()] = "invalid Date"
+    valid = (reasons == "").to_numpy()
+
+    records = pd.DataFrame({
+        "Date": dates[valid].dt.strftime("%Y-%m-%d"),
+        "Category": chunk["Category"][valid],
+        "Amount": amounts[valid].astype(float),
+        "Type": types[valid]
+    })
+
+    rejected = chunk[~valid].copy()
+    rejected.insert(0, "Row", np.arange(first_row, first_row + len(chunk))[~valid])
+    rejected["Reason"] = reasons[~valid]
+
+    return records, rejected
+
+def validate_change(change: dict, categories: List[str] = CATEGORIES) -> tuple:
+    """
+    Validating an edited record in the same way as the table editor: Date must be a date (or a 'YYYY-MM-DD' string), 
+    Category must be in `categories` and Amount must be a number. The Type of a record is never edited, so a negative Amount 
+    is a revenue shown with its sign (see `get_records`), and its absolute value is stored.
+    Returns the parameters of the update as stored (Date as a day number, Category, Amount in cents, id), or raises a 
+    `ValueError`.
+    """
+    record_id = change.get("id")
+    if isinstance(record_id, (bool, np.bool_)) or not isinstance(record_id, (int, np.integer)):
+        raise ValueError(f"Invalid record id {record_id!r}.")
+    
+    date = change.get("Date")
+    if isinstance(date, str):
+        try:
+            date = dt.datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError(f"Invalid Date {date!r} of the record {record_id}.") from None
+    elif not isinstance(date, dt.date):
+        raise ValueError(f"Invalid Date {date!r} of the record {record_id}.")
+    
+    category = change.get("Category")
+    if category not in categories:
+        raise ValueError(f"Unknown Category {category!r} of the record {record_id}.")
+    
+    amount = change.get("Amount")
+    if isinstance(amount, (bool, np.bool_)) or not isinstance(amount, (int, float, np.integer, np.floating)) \
+            or not np.isfinite(amount):
+        raise ValueError(f"Invalid Amount {amount!r} of the record {record_id}, it must be a number.")
+
+    return (to_day(date), category, to_cents(abs(float(amount))), int(record_id))
+
+def apply_migrations(connection: sql.Connection, migrations: List[str]) -> bool:
+    """
+    Upgrading the schema of the database of `connection` with the scripts of `migrations` it hasn't had yet. The version of the 
+    database is tracked with `PRAGMA user_version`, so that each migration is applied only once.
+    Returns whether any migration was applied.
+    """
+    version = connection.execute("PRAGMA user_version;").fetchone()[0]
+
+    for target, script in enumerate(migrations[version:], start = version + 1):
+        ### The migration and the version bump are committed together, or not at all.
+        try:
+            connection.executescript(f"""
+                BEGIN;
+                {script}
+                PRAGMA user_version = {target};
+                COMMIT;
+            """)
+        except sql.Error:
+            connection.rollback()
+            raise
+    
+    return version < len(migrations)
+
+def year_range(year: int) -> tuple:
+    """
+    The first and the last dates of `year`, as "%Y-%m-%d".
+    """
+    return f"{year:04d}-01-01", f"{year:04d}-12-31"
+
+def year_days(year: int) -> tuple:
+    """
+    The first and the last days of `year`, as stored in the ledger (see `to_day`).
+    """
+    return tuple(to_day(date) for date in year_range(year))
+
+def to_day(date) -> int:
+    """
+    The day number of `date` (a date or a "%Y-%m-%d" string): the days since 1970-01-01, as stored in the ledger.
+    """
+    return (dt.date.fromisoformat(date_to_str(date)[:10]) - EPOCH).days
+
+def day_year(day: int) -> int:
+    return (EPOCH + dt.timedelta(days = day)).year
+
+def id_year(record_id: int) -> int:
+    """
+    The year of the date a record id was allocated for (see `DataHandler.allocate_ids`).
+    """
+    return int(record_id) // (ID_SUFFIX_RANGE * 10 ** 4)
+
+def to_cents(amount: float) -> int:
+    return int(round(float(amount) * 100))
+
+def encode_records(records: pd.DataFrame, categories: List[tuple]) -> pd.DataFrame:
+    """
+    A copy of `records` with their Date ("%Y-%m-%d") as day numbers, their Category as the id of its (id, Name) pair in 
+    `categories` and their Amount in cents, as stored in the ledger.
+    """
+    ids, names = zip(*categories) if categories else ((), ())
+    positions = pd.Index(names).get_indexer(records["Category"])
+    if (positions < 0).any():
+        raise ValueError(f"Unknown category {records['Category'].to_numpy()[positions < 0][0]!r}.")
+
+    records = records.copy()
+    records["Category"] = np.array(ids, dtype = np.int64)[positions]
+    records["Date"] = pd.to_datetime(records["Date"], format = "ISO8601").to_numpy().astype("datetime64[D]").astype(np.int64)
+    records["Amount"] = np.rint(records["Amount"].to_numpy(dtype = float) * 100).astype(np.int64)
+
+    return records
+
+def decode_rows(rows: List[tuple], column_names: List[str]) -> pd.DataFrame:
+    """
+    The inverse of `encode_records`: the rows of a query on the ledger or the rollup as a DataFrame of `column_names`, with 
+    the Date as "%Y-%m-%d" and the Amount in units. The Category is left as ids, for `category_names`. The rows are loaded 
+    into a NumPy structured array, which is about twice as fast as letting pandas infer the column types, and keeps them 
+    when there are no rows.
+    """
+    dtype = np.dtype([(name, np.int64 if name in ["id", "Date", "Category", "Amount"] else object) for name in column_names])
+    columns = np.array(rows, dtype = dtype)
+    frame = {name: columns[name] for name in column_names}
+
+    if "Date" in frame:
+        frame["Date"] = format_days(frame["Date"])
+    frame["Amount"] = frame["Amount"] / 100
+
+    return pd.DataFrame(frame, columns = column_names)
+
+def category_names(ids: np.ndarray, categories: List[tuple]) -> pd.Categorical:
+    """
+    The names of the category `ids` as a `pd.Categorical`, whose categories are all those of `categories` (the (id, Name) 
+    pairs of the `categories` table, by id). Each name is stored once, and the records only hold their codes.
+    """
+    category_ids = np.array([category_id for category_id, _ in categories], dtype = np.int64)
+    codes = np.searchsorted(category_ids, np.asarray(ids, dtype = np.int64))
+
+    return pd.Categorical.from_codes(codes, [name for _, name in categories])
+
+def validate_category_name(name: str) -> str:
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"Invalid category name {name!r}.")
+    
+    return name.strip()
+
+def placeholders(n: int) -> str:
+    return ", ".join(["?"] * n)
+
+def date_to_str(date) -> str:
+    if isinstance(date, dt.date):
+        return dt.date.strftime(date, "%Y-%m-%d")
+    
+    return str(date)
\ No newline at end of file
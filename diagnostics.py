@@ -0,0 +1,242 @@
+"""
+Optional instrumentation of the hot paths, for finding out where the time goes when a page is slow: in SQLite, in pandas or
+in the Qt/matplotlib rendering. It is off by default, and switched on with the environment variable `FINDASHBOARD_DIAGNOSTICS=1`
+or with `python main.py --diagnostics`; the dashboard then has a Diagnostics page, from which the timings can be saved as JSON.
+With `FINDASHBOARD_DIAGNOSTICS_FILE=timings.json`, they are also saved when the app quits.
+
+The modules register their hot paths (e.g. the `DataHandler` methods, `TableModel.data` and `MplCanvas.draw`) with
+`DIAGNOSTICS.register`. They are wrapped with timers only while the instrumentation is on, so that they cost nothing otherwise.
+The SQL statements run by the database connections opened meanwhile are counted with `sqlite3`'s `set_trace_callback`, and
+the queries of the `DataHandler` are also timed with their row counts.
+"""
+
+import os
+import re
+import json
+import time
+import bisect
+import threading
+import functools
+import contextlib
+
+ENV_VAR = "FINDASHBOARD_DIAGNOSTICS"
+## The JSON file the app dumps the diagnostics to when it quits (see `main.py`), if set
+DUMP_VAR = "FINDASHBOARD_DIAGNOSTICS_FILE"
+
+## The upper bounds (in seconds) of the histogram buckets: powers of 2 from 1 µs to about 67 s
+BUCKET_BOUNDS = [2 ** k / 1e6 for k in range(27)]
+## The distinct SQL statements kept track of, beyond which they are counted together
+MAX_STATEMENTS = 500
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+## A latency histogram with logarithmic buckets, summarizing any number of timings in constant memory
+class LatencyHistogram:
+    def __init__(self):
+        self._counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self._counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        An estimate of the `q` quantile: the upper bound of its bucket (or the maximum, if it's lower).
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS + [self.max], self._counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "min_ms": self.min * 1000 if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p90_ms": self.quantile(0.9) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "buckets": {f"<={bound * 1000:g} ms" if i < len(BUCKET_BOUNDS) else f">{BUCKET_BOUNDS[-1] * 1000:g} ms": count
+                        for i, (bound, count) in enumerate(zip(BUCKET_BOUNDS + [None], self._counts)) if count}
+        }
+
+class Diagnostics:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._statements = {}
+        self._started = time.time()
+
+        ### The registered hot paths: (class, method name, timing name), and the original methods while they are wrapped
+        self._targets = []
+        self._originals = {}
+
+    def register(self, target: type, names: list, prefix: str = None):
+        """
+        Registering the methods `names` of the class `target` as hot paths, timed as "`prefix`.name" (by default, the name
+        of the class) while the instrumentation is on.
+        """
+        prefix = prefix or target.__name__
+        for name in names:
+            self._targets.append((target, name, f"{prefix}.{name}"))
+            if self.enabled:
+                self._wrap(target, name, f"{prefix}.{name}")
+
+    def enable(self):
+        """
+        Switching the instrumentation on. The database connections opened before are not traced.
+        """
+        self.enabled = True
+        for target in self._targets:
+            self._wrap(*target)
+
+    def disable(self):
+        self.enabled = False
+        for (target, name), method in self._originals.items():
+            if method is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, method)
+
+        self._originals.clear()
+
+    def _wrap(self, target: type, name: str, timing_name: str):
+        if (target, name) in self._originals:
+            return
+
+        method = getattr(target, name)
+        record = self.record
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(timing_name, time.perf_counter() - start)
+
+        ### `None` for a method inherited by `target`: restoring it means deleting the wrapper.
+        self._originals[(target, name)] = target.__dict__.get(name)
+        setattr(target, name, timed)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self._timings.get(name)
+            if histogram is None:
+                histogram = self._timings[name] = LatencyHistogram()
+
+            histogram.record(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.record(name, time.perf_counter() - start)
+
+    def tracer(self):
+        """
+        A `set_trace_callback` for a database connection: counting the executions of each statement, including the ones run
+        by pandas. `sqlite3` reports each step of a trigger as a repeat of the statement that fired it, so the repeats of the
+        previous statement of the connection are not counted.
+        """
+        last = [None]
+
+        def trace(statement: str):
+            if statement != last[0]:
+                last[0] = statement
+                with self._lock:
+                    self._statement(statement)["executions"] += 1
+
+        return trace
+
+    def record_statement(self, statement: str, seconds: float, rows: int):
+        """
+        Recording the time taken by a query, from its execution to its last fetched row, and the number of rows.
+        """
+        with self._lock:
+            stats = self._statement(statement)
+            stats["timing"].record(seconds)
+            stats["rows"] += rows
+
+    def _statement(self, statement: str) -> dict:
+        key = normalize_statement(statement)
+        stats = self._statements.get(key)
+
+        if stats is None:
+            if len(self._statements) >= MAX_STATEMENTS:
+                key = "<other statements>"
+                stats = self._statements.get(key)
+
+            if stats is None:
+                stats = self._statements[key] = {"executions": 0, "rows": 0, "timing": LatencyHistogram()}
+
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._statements.clear()
+            self._started = time.time()
+
+    def snapshot(self) -> dict:
+        """
+        The timings and the SQL statements recorded since the instrumentation started (or was reset), sorted by total time.
+        """
+        with self._lock:
+            timings = {name: histogram.to_dict() for name, histogram in self._timings.items()}
+            statements = [{"statement": statement, "executions": stats["executions"], "rows": stats["rows"],
+                           **stats["timing"].to_dict()}
+                          for statement, stats in self._statements.items()]
+            started = self._started
+
+        return {
+            "enabled": self.enabled,
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+            "seconds": time.time() - started,
+            "timings": dict(sorted(timings.items(), key = lambda item: -item[1]["total_ms"])),
+            "statements": sorted(statements, key = lambda stats: (-stats["total_ms"], -stats["executions"]))
+        }
+
+    def dump(self, file_path: str):
+        with open(file_path, "w") as file:
+            json.dump(self.snapshot(), file, indent = 2)
+
+def normalize_statement(statement: str) -> str:
+    """
+    The statement without its literal values, so that the executions of a statement with different parameters are counted
+    together: the traced statements have their parameters expanded.
+    """
+    statement = _LITERALS.sub("?", statement)
+    statement = _LISTS.sub("?, ...", statement)
+
+    return _SPACES.sub(" ", statement).strip()
+
+def enabled_by_env() -> bool:
+    return os.environ.get(ENV_VAR, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+DIAGNOSTICS = Diagnostics()
+if enabled_by_env():
+    DIAGNOSTICS.enable()
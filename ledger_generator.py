@@ -0,0 +1,218 @@
+"""
+Synthetic ledgers of realistic shape, for load testing and benchmarks. The records are generated with NumPy, chunk by chunk,
+and are the same on any machine for the same arguments:
+
+```bash
+python ledger_generator.py 1000000 --db ledger.db          # into a DataHandler database
+python ledger_generator.py 1000000 --csv ledger.csv        # into a CSV file that `DataHandler.import_file` accepts
+python ledger_generator.py 1000000 --csv - | head          # or onto the standard output
+```
+
+The ledgers span several years. Besides the monthly rent and subscriptions, the categories follow a Zipf-like distribution,
+the amounts are log-normal with a Pareto tail, and a share of the records are revenues (refunds, transfers, ...).
+"""
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+from typing import Iterator, List
+from categories import CATEGORIES
+
+## The monthly records: (category, day of the month, amount, type). The amounts grow by `YEARLY_INCREASE` every year.
+RECURRING = [
+    ("Rent", 1, 1200.0, "Exp"),
+    ("Subscription", 5, 15.99, "Exp"),
+    ("Subscription", 18, 9.99, "Exp"),
+]
+YEARLY_INCREASE = 0.03
+
+## The median amounts of the other records. The categories not listed here (e.g. customized ones) have `DEFAULT_AMOUNT`.
+MEDIAN_AMOUNTS = {
+    "Food": 14.0,
+    "Transportation": 6.0,
+    "Shopping": 45.0,
+    "Online Shopping": 35.0,
+    "Subscription": 12.0,
+    "Utility": 80.0,
+    "Rent": 900.0,
+    "Medical": 60.0,
+    "Study": 40.0,
+    "Entertainment": 25.0,
+    "Insurance": 120.0,
+    "Banking": 20.0,
+}
+DEFAULT_AMOUNT = 30.0
+
+## The average number of records per day. The date span grows with the number of records beyond it, as a day has at most
+## `ID_SUFFIX_RANGE` (10k) record ids.
+DAILY_RECORDS = 2500
+WEEKEND_WEIGHT = 1.4
+
+COLUMN_NAMES = ["Date", "Category", "Amount", "Type"]
+
+
+def category_weights(categories: List[str] = CATEGORIES, skew = 1.1) -> np.ndarray:
+    """
+    The frequencies of the categories in the non-recurring records, decreasing with their position in `categories` as
+    1 / rank ** `skew`. The recurring categories (Rent, Subscription) are rare apart from their monthly records.
+    """
+    recurring = {category for category, *_ in RECURRING}
+    weights = 1 / np.arange(1, len(categories) + 1) ** skew
+    weights[[category in recurring for category in categories]] *= 0.05
+
+    return weights / weights.sum()
+
+def day_weights(start: np.datetime64, n_days: int) -> np.ndarray:
+    """
+    The frequencies of the days from `start` on: the weekends weigh `WEEKEND_WEIGHT` times more than the weekdays.
+    """
+    ### 1970-01-01 (day 0) was a Thursday, so (day + 3) % 7 counts from Monday.
+    weekdays = (start.astype("datetime64[D]").astype(np.int64) + np.arange(n_days) + 3) % 7
+    weights = np.where(weekdays >= 5, WEEKEND_WEIGHT, 1.0)
+
+    return weights / weights.sum()
+
+def recurring_records(start: np.datetime64, n_days: int) -> pd.DataFrame:
+    """
+    The `RECURRING` records of every month from `start` on, over `n_days` days.
+    """
+    end = start + n_days
+    months = np.arange(start.astype("datetime64[M]"), end.astype("datetime64[M]") + 1)
+    years = (months - months[0]).astype(np.int64) // 12
+
+    frames = []
+    for category, day, amount, type_ in RECURRING:
+        dates = months.astype("datetime64[D]") + (day - 1)
+        in_span = (dates >= start) & (dates < end)
+        frames.append(pd.DataFrame({
+            "Date": dates[in_span],
+            "Category": category,
+            "Amount": np.round(amount * (1 + YEARLY_INCREASE) ** years[in_span], 2),
+            "Type": type_
+        }))
+
+    return pd.concat(frames, ignore_index = True).sort_values("Date", kind = "stable", ignore_index = True)
+
+def random_records(rng: np.random.Generator, n_rows: int, start: np.datetime64, n_days: int,
+                   categories: List[str] = CATEGORIES, rev_share = 0.15) -> pd.DataFrame:
+    """
+    `n_rows` non-recurring records between `start` and `start + n_days`, sorted by date.
+    """
+    days = np.sort(rng.choice(n_days, n_rows, p = day_weights(start, n_days)))
+    codes = rng.choice(len(categories), n_rows, p = category_weights(categories))
+    medians = np.array([MEDIAN_AMOUNTS.get(category, DEFAULT_AMOUNT) for category in categories])
+
+    ### Log-normal amounts around the median of the category, and a heavy (Pareto) tail for 2% of them
+    amounts = medians[codes] * rng.lognormal(0, 0.8, n_rows)
+    tail = rng.random(n_rows) < 0.02
+    amounts[tail] *= 1 + rng.pareto(1.5, tail.sum())
+
+    return pd.DataFrame({
+        "Date": start + days,
+        "Category": np.asarray(categories)[codes],
+        "Amount": np.maximum(np.round(amounts, 2), 0.01),
+        "Type": np.where(rng.random(n_rows) < rev_share, "Rev", "Exp")
+    })
+
+def iter_ledger(n_rows: int, seed = 0, chunk_size = 1_000_000, start = "2019-01-01", years = 5,
+                categories: List[str] = CATEGORIES, rev_share = 0.15) -> Iterator[pd.DataFrame]:
+    """
+    Generating a synthetic ledger chunk by chunk.
+    ## Parameters:
+    - `n_rows`: `int`. The number of records in total.
+    - `seed`: `int`, default `0`. The same seed (and other arguments) gives the same records.
+    - `chunk_size`: `int`, default `1_000_000`. The maximal number of records per chunk.
+    - `start`: `str`, default `"2019-01-01"`. The first date of the ledger.
+    - `years`: `int`, default `5`. The span of the ledger, which is longer if it has more than `DAILY_RECORDS` records per day.
+    - `categories`: `List[str]`, default the preset category list `CATEGORIES`.
+    - `rev_share`: `float`, default `0.15`. The share of revenues in the non-recurring records.
+    Yields DataFrames with the columns Date (as "%Y-%m-%d"), Category, Amount and Type, each sorted by date. The monthly
+    records come first.
+    """
+    start = np.datetime64(start, "D")
+    n_days = max(round(years * 365.25), -(-n_rows // DAILY_RECORDS))
+
+    recurring = recurring_records(start, n_days).head(n_rows)
+    sizes = [len(recurring)] if len(recurring) else []
+    remaining = n_rows - len(recurring)
+    sizes += [min(chunk_size, remaining - offset) for offset in range(0, remaining, chunk_size)]
+
+    for k, size in enumerate(sizes):
+        if k == 0 and len(recurring):
+            chunk = recurring
+        else:
+            ### Each chunk has its own generator, so that a chunk doesn't depend on how the previous ones were consumed.
+            chunk = random_records(np.random.default_rng([seed, k]), size, start, n_days, categories, rev_share)
+
+        chunk["Date"] = np.datetime_as_string(chunk["Date"].to_numpy().astype("datetime64[D]"))
+        yield chunk
+
+def generate_ledger(n_rows: int, seed = 0, **kwargs) -> pd.DataFrame:
+    """
+    A synthetic ledger of `n_rows` records in one DataFrame, sorted by date. See `iter_ledger` for the parameters.
+    """
+    frame = pd.concat(iter_ledger(n_rows, seed, **kwargs), ignore_index = True)
+
+    return frame.sort_values("Date", kind = "stable", ignore_index = True)
+
+def write_database(db, n_rows: int, seed = 0, **kwargs) -> int:
+    """
+    Inserting a synthetic ledger into the database of `db` (a `DataHandler`), one transaction per chunk. The records get new
+    ids, so the database doesn't need to be empty. See `iter_ledger` for the parameters.
+    Returns the number of inserted records.
+    """
+    inserted = 0
+    for chunk in iter_ledger(n_rows, seed, **kwargs):
+        inserted += db.add_records(chunk)
+
+    return inserted
+
+def write_csv(file, n_rows: int, seed = 0, **kwargs) -> int:
+    """
+    Writing a synthetic ledger as CSV (with the header Date,Category,Amount,Type) to `file`, a path or a text stream.
+    See `iter_ledger` for the parameters.
+    Returns the number of written records.
+    """
+    if isinstance(file, str):
+        with open(file, "w", newline = "") as stream:
+            return write_csv(stream, n_rows, seed, **kwargs)
+
+    written = 0
+    for chunk in iter_ledger(n_rows, seed, **kwargs):
+        chunk.to_csv(file, header = written == 0, index = False, lineterminator = "\n")
+        written += len(chunk)
+
+    return written
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(description = "Generating a synthetic ledger.")
+    parser.add_argument("n_rows", type = int, help = "The number of records.")
+    target = parser.add_mutually_exclusive_group(required = True)
+    target.add_argument("--db", help = "The database to insert the records into.")
+    target.add_argument("--csv", help = "The CSV file to write the records to, or - for the standard output.")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--start", default = "2019-01-01", help = "The first date of the ledger.")
+    parser.add_argument("--years", type = int, default = 5, help = "The (minimal) span of the ledger.")
+    parser.add_argument("--rev-share", type = float, default = 0.15, help = "The share of revenues.")
+    args = parser.parse_args(argv)
+
+    kwargs = {"start": args.start, "years": args.years, "rev_share": args.rev_share}
+    if args.csv is not None:
+        write_csv(sys.stdout if args.csv == "-" else args.csv, args.n_rows, args.seed, **kwargs)
+
+    else:
+        ### Imported here, so that writing CSV doesn't need the database module
+        from data_manipulation import DataHandler
+
+        db = DataHandler(args.db)
+        try:
+            write_database(db, args.n_rows, args.seed, **kwargs)
+        finally:
+            db.close_connection()
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,63 @@
+## The start time, before any import, for the startup report (see `StartupReport`)
+import time
+STARTED = time.perf_counter()
+
+import os
 import sys
+from PyQt5.QtCore import QObject, QEvent
+from diagnostics import DIAGNOSTICS, DUMP_VAR
 from dashboard import *
 from data_manipulation import *
 
+## Reporting the time spent in each phase of the startup, from the imports to the first paint of the window, with 
+## `python main.py --startup-report`. The app quits after the report, e.g. for tracking cold starts on large databases.
+class StartupReport(QObject):
+    def __init__(self, started: float):
+        super().__init__()
+        self._marks = [("start", started)]
+
+    def mark(self, phase: str):
+        self._marks.append((phase, time.perf_counter()))
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first paint")
+            print(self.report())
+            QTimer.singleShot(0, watched.close)
+        
+        return False
+
+    def report(self) -> str:
+        phases = [f"{phase} {(end - start) * 1000:.0f} ms" 
+                  for (_, start), (phase, end) in zip(self._marks[:-1], self._marks[1:])]
+        total = (self._marks[-1][1] - self._marks[0][1]) * 1000
+
+        return f"Startup: {', '.join(phases)}, total {total:.0f} ms"
+
 if __name__ == "__main__":
+    startup = StartupReport(STARTED)
+    startup.mark("imports")
+
+    ### Before the database is opened, so that its connections are traced
+    if "--diagnostics" in sys.argv:
+        DIAGNOSTICS.enable()
+
     app = QApplication(sys.argv)
     app.setStyleSheet(GLOBAL_STYLES)
-    db = DataHandler()
+    db = DataHandler(partitioned = "--partitioned" in sys.argv)
+    startup.mark("database")
+
     window = DashBoard(db)
+    startup.mark("window")
+
+    if "--startup-report" in sys.argv:
+        window.installEventFilter(startup)
+    
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+
+    if DIAGNOSTICS.enabled and os.environ.get(DUMP_VAR):
+        DIAGNOSTICS.dump(os.environ[DUMP_VAR])
+    
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""
+Columnar snapshots of past years of the ledger, for reading cold history without SQLite. A snapshot holds the records of
+one year as one NumPy array per column, sorted by date and id, in a directory next to the database (e.g.
+`expenditrue.snapshots/2023.v1/`):
+
+- `id.npy`: the record ids (`int64`);
+- `day.npy`: the dates, as days since 1970-01-01 (`int32`);
+- `category.npy`: the categories, as codes into `categories.json`, which lists their ids in sorted order (`uint16`);
+- `type.npy`: 0 for expenditures and 1 for revenues (`uint8`);
+- `cents.npy`: the amounts in integer cents (`int64`).
+
+The arrays are opened with `np.load(mmap_mode = "r")`, so opening a snapshot reads nothing but the headers, and a query
+only reads the pages of its date range. `DataHandler.snapshot_years` writes them, and keeps track of them in the
+`snapshots` table of the database.
+"""
+
+import os
+import json
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+from typing import Iterable, List
+
+SNAPSHOT_COLUMNS = {
+    "id": np.int64,
+    "day": np.int32,
+    "category": np.uint16,
+    "type": np.uint8,
+    "cents": np.int64
+}
+TYPES = ["Exp", "Rev"]
+
+## The dates of a range of day numbers already formatted by `format_days` (the first day, and the strings), widened as 
+## needed. It's replaced as a whole, so that threads never see it half updated.
+_formatted = (0, np.empty(0, dtype = object))
+
+
+class YearSnapshot:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode = "r") for name in SNAPSHOT_COLUMNS}
+
+        with open(os.path.join(directory, "categories.json"), encoding = "utf-8") as file:
+            self.categories = json.load(file)
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    @staticmethod
+    def write(directory: str, chunks: Iterable[List[tuple]]) -> int:
+        """
+        Writing a snapshot of the (id, Date, Category, Amount, Type) rows of `chunks` as stored in the ledger (day numbers 
+        and cents), sorted by date and id, to `directory`. The arrays are written to a temporary directory first, and moved 
+        into place once complete.
+        Returns the number of rows.
+        """
+        columns = {name: [] for name in SNAPSHOT_COLUMNS}
+        codes = {}
+
+        for rows in chunks:
+            ids, days, categories, cents, types = zip(*rows)
+            columns["id"].append(np.array(ids, dtype = np.int64))
+            columns["day"].append(np.array(days, dtype = np.int32))
+            columns["cents"].append(np.array(cents, dtype = np.int64))
+            columns["type"].append((np.array(types) == "Rev").astype(np.uint8))
+
+            ### Codes in the order the categories are met, renumbered in sorted order at the end
+            chunk_codes, uniques = pd.factorize(np.array(categories, dtype = np.int64))
+            lookup = np.array([codes.setdefault(int(category), len(codes)) for category in uniques], dtype = np.uint16)
+            columns["category"].append(lookup[chunk_codes])
+
+        categories = sorted(codes)
+        renumber = np.empty(len(codes), dtype = np.uint16)
+        renumber[[codes[category] for category in categories]] = np.arange(len(categories))
+
+        temporary = directory + ".tmp"
+        shutil.rmtree(temporary, ignore_errors = True)
+        os.makedirs(temporary)
+
+        for name, dtype in SNAPSHOT_COLUMNS.items():
+            values = np.concatenate(columns[name]).astype(dtype) if columns[name] else np.empty(0, dtype = dtype)
+            if name == "category":
+                values = renumber[values]
+            np.save(os.path.join(temporary, f"{name}.npy"), values)
+
+        with open(os.path.join(temporary, "categories.json"), "w", encoding = "utf-8") as file:
+            json.dump(categories, file)
+
+        os.replace(temporary, directory)
+
+        return sum(len(ids) for ids in columns["id"])
+
+    def _select(self, first_day: int, last_day: int, categories: List[int], types: List[str]) -> np.ndarray:
+        """
+        The positions of the records from `first_day` to `last_day` (both included), of the category ids `categories` (`None` for all) and
+        `types`. As the records are sorted by date, the date range is a slice found by binary search.
+        """
+        start, stop = np.searchsorted(self.columns["day"], [first_day, last_day + 1])
+        selected = np.ones(stop - start, dtype = bool)
+
+        if categories is not None:
+            wanted = np.isin(self.categories, list(categories))
+            selected &= wanted[self.columns["category"][start:stop]]
+
+        if set(types) != set(TYPES):
+            selected &= np.isin(self.columns["type"][start:stop], [TYPES.index(type_) for type_ in types])
+
+        return start + np.flatnonzero(selected)
+
+    def _amounts(self, positions: np.ndarray, signed: bool) -> np.ndarray:
+        """
+        The amounts in cents of the records at `positions`, with the revenues negative if `signed`.
+        """
+        cents = self.columns["cents"][positions]
+        if signed:
+            cents = np.where(self.columns["type"][positions] == 1, -cents, cents)
+
+        return cents
+
+    def records(self, first_day: int, last_day: int, categories: List[int], types: List[str],
+                include_id = False) -> pd.DataFrame:
+        """
+        The records selected as in `_select`, as a DataFrame with the columns of `DataHandler.get_records`: id (if
+        `include_id`), Date (as "%Y-%m-%d"), Category (as ids) and Amount. Revenues are negative when both types are selected.
+        """
+        positions = self._select(first_day, last_day, categories, types)
+        category_ids = np.array(self.categories, dtype = np.int64)
+
+        frame = pd.DataFrame({
+            "Date": format_days(self.columns["day"][positions]),
+            "Category": category_ids[self.columns["category"][positions]],
+            "Amount": self._amounts(positions, len(types) > 1) / 100
+        })
+
+        if include_id:
+            frame.insert(0, "id", np.asarray(self.columns["id"][positions]))
+
+        return frame
+
+    def totals(self, first_day: int, last_day: int, categories: List[int], types: List[str],
+               group_date = False, group_category = False) -> pd.DataFrame:
+        """
+        The sums of the records selected as in `_select` by Date and/or Category, and by Type, summed exactly in cents.
+        Returns the columns Date and/or Category, Type and Amount, in the order of the grouped queries of `get_records`.
+        """
+        positions = self._select(first_day, last_day, categories, types)
+        days = self.columns["day"][positions]
+        first = int(days[0]) if len(days) else 0
+
+        keys, shape = [], []
+        if group_date:
+            keys.append(days - first)
+            shape.append(int(days[-1]) - first + 1 if len(days) else 1)
+        if group_category:
+            keys.append(self.columns["category"][positions])
+            shape.append(max(len(self.categories), 1))
+        keys.append(self.columns["type"][positions])
+        shape.append(len(TYPES))
+
+        ### The groups are numbered in the order of their keys, so that they come out sorted as from SQLite. The numbers are 
+        ### few (days by categories by types), so they are counted and summed without sorting the records.
+        flat = np.ravel_multi_index(keys, shape)
+        groups = np.flatnonzero(np.bincount(flat, minlength = int(np.prod(shape))))
+        cents = np.bincount(flat, weights = self._amounts(positions, len(types) > 1), minlength = int(np.prod(shape)))[groups]
+        keys = np.unravel_index(groups, shape)
+
+        frame = {}
+        if group_date:
+            frame["Date"] = format_days(keys[0] + first)
+        if group_category:
+            frame["Category"] = np.array(self.categories, dtype = np.int64)[keys[-2]]
+        frame["Type"] = np.array(TYPES, dtype = object)[keys[-1]]
+        frame["Amount"] = cents / 100
+
+        return pd.DataFrame(frame)
+
+class SnapshotStore:
+    """
+    The snapshot directories of a database: one per year and version, so that a new snapshot never replaces the files of
+    one still mapped by a reader. The old versions are removed when possible.
+    """
+    def __init__(self, db_name: str):
+        self._directory = f"{os.path.splitext(db_name)[0]}.snapshots"
+        self._lock = threading.Lock()
+        self._opened = {}
+
+    def path(self, year: int, version: int) -> str:
+        return os.path.join(self._directory, f"{year}.v{version}")
+
+    def write(self, year: int, version: int, chunks: Iterable[List[tuple]]) -> int:
+        os.makedirs(self._directory, exist_ok = True)
+        rows = YearSnapshot.write(self.path(year, version), chunks)
+
+        if rows == 0:
+            shutil.rmtree(self.path(year, version), ignore_errors = True)
+
+        return rows
+
+    def open(self, year: int, version: int) -> YearSnapshot:
+        """
+        The snapshot of `year` at `version`, mapped once and reused by all threads.
+        """
+        with self._lock:
+            snapshot = self._opened.get(year)
+            if snapshot is None or snapshot.directory != self.path(year, version):
+                snapshot = self._opened[year] = YearSnapshot(self.path(year, version))
+
+            return snapshot
+
+    def remove(self, year: int, keep: int = None):
+        """
+        Removing the snapshot directories of `year`, except the one of version `keep`. The directories still mapped (which
+        can't be removed on Windows) are left for a later call.
+        """
+        with self._lock:
+            if year in self._opened and self._opened[year].directory != self.path(year, keep):
+                del self._opened[year]
+
+        if not os.path.isdir(self._directory):
+            return
+
+        for name in os.listdir(self._directory):
+            if name.split(".")[0] == str(year) and name != os.path.basename(self.path(year, keep)):
+                shutil.rmtree(os.path.join(self._directory, name), ignore_errors = True)
+
+    def forget(self):
+        """
+        Unmapping the snapshots, when the database is closed.
+        """
+        with self._lock:
+            self._opened.clear()
+
+def format_days(days: np.ndarray) -> np.ndarray:
+    """
+    The dates of the day numbers `days` (days since 1970-01-01) as "%Y-%m-%d" strings, in an object array. Each date is 
+    formatted once (see `_formatted`), and its string is shared by the days.
+    """
+    global _formatted
+
+    days = np.asarray(days, dtype = np.int64)
+    if not len(days):
+        return np.empty(0, dtype = object)
+    
+    first, dates = _formatted
+    low, high = int(days.min()), int(days.max())
+    if low < first or high >= first + len(dates):
+        if len(dates):
+            low, high = min(low, first), max(high, first + len(dates) - 1)
+        
+        first = low
+        dates = np.datetime_as_string(np.arange(low, high + 1).astype("datetime64[D]")).astype(object)
+        _formatted = (first, dates)
+
+    return dates[days - first]